@@ -3,22 +3,118 @@
 This module provides a generator function to stream users from a database.
 """
 
-from seed import connect_to_prodev
+import time
 
-def stream_users():
+import mysql.connector
+
+from instrumentation import instrumented
+from seed import (USER_COLUMNS, build_select, close_cursor, get_connection,
+                  load_checkpoint, release_connection, save_checkpoint)
+
+# Errors after which the stream reconnects instead of giving up
+RETRYABLE_ERRORS = (mysql.connector.InterfaceError, mysql.connector.OperationalError)
+
+@instrumented
+def stream_users(fetch_size=1000, as_tuples=False, columns=None, where=None,
+                 row_factory=None):
     """
     Fetches users from the database one by one and yields them.
+
+    Rows are read from an unbuffered cursor fetch_size at a time, so the
+    result set is never held in client memory. With as_tuples=True rows
+    are yielded as plain tuples in column order, skipping the per-row
+    dict construction.
+
+    columns and where are pushed into the SQL (see seed.build_select), so
+    only the requested columns of matching rows cross the wire.
+
+    row_factory, e.g. seed.UserRow._make, is called with each row tuple
+    and its result is yielded instead of a dict.
     """
-    connection = connect_to_prodev()
+    query, params = build_select(columns, where)
+    connection = get_connection()
     if not connection:
         return
 
+    cursor = None
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data")
-        for row in cursor:
-            yield row
+        dictionary = not as_tuples and row_factory is None
+        cursor = connection.cursor(buffered=False, dictionary=dictionary)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            if row_factory is not None:
+                rows = map(row_factory, rows)
+            yield from rows
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        close_cursor(cursor)
+        release_connection(connection)
+
+
+@instrumented
+def resumable_stream_users(checkpoint_file=None, last_user_id=None, fetch_size=1000,
+                           as_tuples=False, columns=None, where=None, row_factory=None,
+                           max_retries=5, retry_delay=1.0):
+    """
+    Yields users in user_id order and survives dropped connections.
+
+    The scan is an ordered keyset read (WHERE user_id > last ORDER BY
+    user_id) that remembers the last user_id delivered. When the
+    connection fails with a retryable error the stream reconnects,
+    waiting retry_delay seconds and doubling it on each consecutive
+    failure, and continues after that user_id; after max_retries failures
+    in a row the error is raised.
+
+    With checkpoint_file the last user_id is saved each time the consumer
+    has taken a whole fetch, and a later run starts from the saved
+    position, so a restarted process re-delivers at most one fetch.
+    last_user_id starts after a given user_id instead. The other
+    arguments are those of stream_users; columns must include user_id.
+    """
+    names = tuple(columns) if columns else USER_COLUMNS
+    if 'user_id' not in names:
+        raise ValueError("columns must include user_id to resume the stream")
+    key_index = names.index('user_id')
+    if last_user_id is None and checkpoint_file:
+        state = load_checkpoint(checkpoint_file)
+        if state:
+            last_user_id = state['last_user_id']
+    dictionary = not as_tuples and row_factory is None
+
+    failures = 0
+    while True:
+        conditions = list(where or [])
+        if last_user_id is not None:
+            conditions.append(('user_id', '>', last_user_id))
+        query, params = build_select(names, conditions, order_by='user_id')
+
+        connection = get_connection()
+        cursor = None
+        try:
+            if not connection:
+                raise mysql.connector.InterfaceError("could not connect to the database")
+            cursor = connection.cursor(buffered=False, dictionary=dictionary)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    return
+                failures = 0
+                for row in rows:
+                    last_user_id = row['user_id'] if dictionary else row[key_index]
+                    yield row_factory(row) if row_factory is not None else row
+                if checkpoint_file:
+                    save_checkpoint(checkpoint_file, {'last_user_id': last_user_id})
+        except RETRYABLE_ERRORS as err:
+            failures += 1
+            if failures > max_retries:
+                raise
+            delay = retry_delay * 2 ** (failures - 1)
+            print(f"Stream interrupted after user_id {last_user_id}: {err}; "
+                  f"reconnecting in {delay:g}s ({failures}/{max_retries})")
+        finally:
+            close_cursor(cursor)
+            release_connection(connection)
+        time.sleep(delay)
@@ -4,35 +4,97 @@ This module provides functions for batch processing of user data
 from a MySQL database.
 """
 
-from seed import connect_to_prodev
+import time
 
-def stream_users_in_batches(batch_size=50):
+from batch_sizing import AdaptiveBatchSizer
+from columnar import ColumnarBatch
+from instrumentation import instrumented
+from parallel_scan import parallel_stream_users_in_batches
+from prefetch import read_ahead
+from seed import USER_COLUMNS, build_select, close_cursor, get_connection, release_connection
+
+@instrumented
+def stream_users_in_batches(batch_size=50, columns=None, where=None, columnar=False,
+                            prefetch=0, row_factory=None, adaptive=None, order_by=None):
     """
     Fetches users from the database in batches and yields them.
+
+    columns, where and order_by are pushed into the SQL (see
+    seed.build_select), so rows are projected, filtered and, if asked,
+    sorted by the server. With columnar=True each batch is a
+    columnar.ColumnarBatch holding one array per column instead of a list
+    of dicts; this is only faster with numpy installed (see columnar.py). With prefetch=k a background thread keeps up to k batches
+    fetched ahead of the consumer. row_factory, e.g. seed.UserRow._make,
+    builds each row from its tuple instead of a dict.
+
+    adaptive=True (or a batch_sizing.AdaptiveBatchSizer, to set targets
+    and a stats hook) starts at batch_size and then resizes every fetch
+    towards a target batch memory footprint and fetch latency.
     """
-    connection = connect_to_prodev()
+    if prefetch:
+        yield from read_ahead(
+            stream_users_in_batches(batch_size, columns, where, columnar,
+                                    row_factory=row_factory, adaptive=adaptive,
+                                    order_by=order_by),
+            prefetch)
+        return
+
+    sizer = adaptive
+    if adaptive is True:
+        sizer = AdaptiveBatchSizer(initial=batch_size)
+
+    query, params = build_select(columns, where, order_by=order_by)
+    connection = get_connection()
     if not connection:
         return
 
+    cursor = None
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data")
+        cursor = connection.cursor(dictionary=not columnar and row_factory is None)
+        cursor.execute(query, params)
+        names = tuple(columns) if columns else USER_COLUMNS
         while True:
-            batch = cursor.fetchmany(batch_size)
+            if sizer:
+                started = time.perf_counter()
+                batch = cursor.fetchmany(sizer.size)
+                sizer.observe(batch, time.perf_counter() - started)
+            else:
+                batch = cursor.fetchmany(batch_size)
             if not batch:
                 break
+            if columnar:
+                batch = ColumnarBatch.from_rows(names, batch)
+            elif row_factory is not None:
+                batch = [row_factory(row) for row in batch]
             yield batch
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        close_cursor(cursor)
+        release_connection(connection)
 
-def batch_processing(batch_size=50):
+def batch_processing(batch_size=50, workers=None):
     """
     Processes user batches to filter users over the age of 25.
+    With workers set the table is scanned by that many processes.
     """
-    user_stream = stream_users_in_batches(batch_size)
+    where = [('age', '>', 25)]
+    if workers:
+        user_stream = parallel_stream_users_in_batches(workers, batch_size, where=where)
+    else:
+        user_stream = stream_users_in_batches(batch_size, where=where)
     for batch in user_stream:
         for user in batch:
-            if user['age'] > 25:
+            print(user)
+
+def print_users_over(batches, age=25):
+    """
+    Prints the users older than age from already fetched batches of dict
+    rows and returns how many were printed. This is the consumer form of
+    batch_processing, for use with shared_scan.
+    """
+    printed = 0
+    for batch in batches:
+        for user in batch:
+            if user['age'] > age:
                 print(user)
+                printed += 1
+    return printed
@@ -3,30 +3,127 @@
 This module provides a generator for lazy pagination of user data.
 """
 
+import base64
 import seed
+from instrumentation import instrumented
+from prefetch import read_ahead
 
-def paginate_users(page_size, offset):
-    """Fetches a page of users from the database."""
-    connection = seed.connect_to_prodev()
+def paginate_users(page_size, offset, row_factory=None):
+    """
+    Fetches a page of users from the database. row_factory, e.g.
+    seed.UserRow._make, builds each row from its tuple instead of a dict.
+    """
+    query, _ = seed.build_select()
+    connection = seed.get_connection()
     if not connection:
         return []
+    cursor = None
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
+        cursor = connection.cursor(dictionary=row_factory is None)
+        cursor.execute(query + " LIMIT %s OFFSET %s", (page_size, offset))
         rows = cursor.fetchall()
+        if row_factory is not None:
+            rows = [row_factory(row) for row in rows]
         return rows
     finally:
-        if connection and connection.is_connected():
-            cursor.close()
-            connection.close()
+        seed.close_cursor(cursor)
+        seed.release_connection(connection)
+
+def _keyset_query():
+    query, _ = seed.build_select()
+    return query + " WHERE user_id > %s ORDER BY user_id LIMIT %s"
+
+def paginate_users_after(page_size, last_user_id=None, row_factory=None, cursor=None):
+    """
+    Fetches the page of users that follows last_user_id in user_id order.
+
+    The query seeks on the primary key instead of skipping rows with
+    OFFSET, so every page costs the same however deep it is. The values
+    are bound through a server-side prepared statement, never formatted
+    into the SQL. row_factory works as in paginate_users.
 
-def lazy_pagination(page_size):
+    cursor, if given, is a prepared cursor opened by the caller (as
+    lazy_pagination does), which is re-executed with the new values
+    instead of preparing the statement on a fresh connection.
+    """
+    if cursor is not None:
+        cursor.execute(_keyset_query(), (last_user_id or '', page_size))
+        rows = cursor.fetchall()
+        if row_factory is not None:
+            rows = [row_factory(row) for row in rows]
+        return rows
+
+    connection = seed.get_connection()
+    if not connection:
+        return []
+    try:
+        cursor = connection.cursor(prepared=True, dictionary=row_factory is None)
+        return paginate_users_after(page_size, last_user_id, row_factory, cursor)
+    finally:
+        seed.close_cursor(cursor)
+        seed.release_connection(connection)
+
+def encode_resume_token(last_user_id):
+    """Turns the last user_id seen into an opaque resume token."""
+    return base64.urlsafe_b64encode(last_user_id.encode('utf-8')).decode('ascii')
+
+def decode_resume_token(token):
+    """Recovers the last user_id seen from a resume token."""
+    return base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+
+def resume_token_for(page):
+    """
+    Returns the token that resumes keyset pagination after page. The rows
+    must support row['user_id'] (dicts and seed.UserRow do).
+    """
+    return encode_resume_token(page[-1]['user_id'])
+
+@instrumented
+def lazy_pagination(page_size, keyset=False, resume_token=None, prefetch=0,
+                    row_factory=None):
     """
     Lazily fetches pages of users from the database.
+
+    With keyset=True pages are read in user_id order by seeking past the
+    last user_id seen, and resume_token (see resume_token_for) continues a
+    previous walk from where it stopped. With prefetch=k a background
+    thread keeps up to k pages fetched ahead of the consumer. row_factory,
+    e.g. seed.UserRow._make, builds the rows of every page.
     """
+    if prefetch:
+        yield from read_ahead(
+            lazy_pagination(page_size, keyset, resume_token,
+                            row_factory=row_factory), prefetch)
+        return
+
+    if keyset:
+        last_user_id = decode_resume_token(resume_token) if resume_token else None
+        # One connection and one prepared statement serve the whole walk
+        connection = seed.get_connection()
+        if not connection:
+            return
+        cursor = None
+        try:
+            # With a factory, fetch tuples so the last user_id is always known
+            cursor = connection.cursor(prepared=True, dictionary=row_factory is None)
+            while True:
+                page = paginate_users_after(page_size, last_user_id, cursor=cursor)
+                if not page:
+                    break
+                if row_factory is None:
+                    last_user_id = page[-1]['user_id']
+                else:
+                    last_user_id = page[-1][0]
+                    page = [row_factory(row) for row in page]
+                yield page
+        finally:
+            seed.close_cursor(cursor)
+            seed.release_connection(connection)
+        return
+
     offset = 0
     while True:
-        page = paginate_users(page_size, offset)
+        page = paginate_users(page_size, offset, row_factory)
         if not page:
             break
         yield page
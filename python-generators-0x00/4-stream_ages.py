@@ -4,42 +4,250 @@ This module provides a memory-efficient way to calculate the average age
 of users from a database using generators.
 """
 
-from seed import connect_to_prodev
+import random
+import time
 
-def stream_user_ages():
-    """Yields user ages one by one from the database."""
-    connection = connect_to_prodev()
+from instrumentation import instrumented
+from parallel_scan import map_partitions
+from sampling import mean_estimate, random_user_id_key, reservoir_sample, stats_of
+from seed import (build_select, build_where, close_cursor, get_connection,
+                  pooled_connection, release_connection)
+from stream_stats import QuantileSketch, RunningStats, summarize, summary_of
+
+# Block sampling never stops on its interval before this many blocks
+MIN_BLOCKS = 30
+
+@instrumented
+def stream_user_ages(fetch_size=1000, where=None):
+    """
+    Yields user ages one by one from the database, reading them from an
+    unbuffered cursor fetch_size rows at a time. where (see
+    seed.build_where) restricts the stream to one cohort of users.
+    """
+    query, params = build_select(['age'], where)
+    yield from _stream_ages(query, params, fetch_size)
+
+@instrumented
+def sample_user_ages(rate, where=None, fetch_size=1000):
+    """
+    Yields the ages of a Bernoulli sample of users: each row is kept with
+    probability rate by RAND() in the SQL, so only the sample is sent.
+    """
+    select, _ = build_select(['age'])
+    clause, params = build_where(where)
+    query = select + clause + (" AND " if clause else " WHERE ") + "RAND() < %s"
+    yield from _stream_ages(query, params + (rate,), fetch_size)
+
+def _stream_ages(query, params, fetch_size):
+    """Streams the first column of query from an unbuffered cursor."""
+    connection = get_connection()
     if not connection:
         return
 
+    cursor = None
+    try:
+        # Unbuffered: rows stay on the server until they are fetched
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0]
+    finally:
+        close_cursor(cursor)
+        release_connection(connection)
+
+def aggregate_ages(where=None):
+    """
+    Lets the database compute count, mean, min, max and variance of the
+    ages in one query, so no individual age is sent to Python.
+    """
+    clause, params = build_where(where)
+    connection = get_connection()
+    if not connection:
+        return None
+
+    cursor = None
     try:
-        # Use a server-side cursor for large datasets if supported
         cursor = connection.cursor()
-        cursor.execute("SELECT age FROM user_data")
-        for row in cursor:
-            yield row[0]
+        cursor.execute(
+            "SELECT COUNT(age), AVG(age), MIN(age), MAX(age), VAR_POP(age) "
+            "FROM user_data" + clause,
+            params
+        )
+        count, mean, minimum, maximum, variance = cursor.fetchone()
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        close_cursor(cursor)
+        release_connection(connection)
 
-def calculate_average_age():
+    if not count:
+        return {'count': 0, 'mean': None, 'variance': 0.0,
+                'min': None, 'max': None}
+    return {
+        'count': count,
+        'mean': float(mean),
+        'variance': float(variance),
+        'min': float(minimum),
+        'max': float(maximum),
+    }
+
+def _partition_age_stats(batches):
+    """Summarizes the ages of one partition; runs in a worker process."""
+    stats = RunningStats()
+    sketch = QuantileSketch()
+    for batch in batches:
+        for (age,) in batch:
+            stats.add(age)
+            sketch.add(float(age))
+    return stats, sketch
+
+def parallel_age_stats(workers=4, where=None):
     """
-    Calculates the average age from the stream of user ages.
+    Scans the ages in workers partitions in parallel (see parallel_scan)
+    and merges the per-partition RunningStats and QuantileSketch.
+    """
+    stats = RunningStats()
+    sketch = QuantileSketch()
+    for part_stats, part_sketch in map_partitions(
+            _partition_age_stats, workers, columns=['age'], where=where,
+            as_tuples=True):
+        stats.merge(part_stats)
+        sketch.merge(part_sketch)
+    return stats, sketch
+
+def calculate_age_stats(percentiles=(50, 95), where=None, workers=None):
+    """
+    Computes count, mean, variance, min/max and approximate percentiles
+    of the ages in a single pass over the stream, in constant memory.
+    With workers set the scan is split across that many processes.
+    """
+    if workers:
+        stats, sketch = parallel_age_stats(workers, where)
+        return summary_of(stats, sketch, percentiles)
+    return summarize(stream_user_ages(where=where), percentiles)
+
+def _age_blocks(block_size, where, rng):
+    """
+    Yields the ages of random contiguous blocks of block_size rows, each
+    found with an index seek to a random user_id, on one connection.
     """
-    total_age = 0
-    user_count = 0
-    age_generator = stream_user_ages()
+    select, _ = build_select(['age'])
+    clause, params = build_where(where)
+    query = (select + clause + (" AND " if clause else " WHERE ")
+             + "user_id >= %s ORDER BY user_id LIMIT %s")
+    with pooled_connection() as connection:
+        if not connection:
+            return
+        cursor = connection.cursor()
+        try:
+            while True:
+                cursor.execute(query, params + (random_user_id_key(rng), block_size))
+                yield [row[0] for row in cursor.fetchall()]
+        finally:
+            close_cursor(cursor)
+
+def estimate_average_age(method='block', target_error=0.5, confidence=0.95,
+                         time_budget=1.0, block_size=200, rate=0.01,
+                         sample_size=10000, where=None, seed=None):
+    """
+    Estimates the average age from a sample and returns a dict with the
+    estimate, its confidence interval (ci_low, ci_high, half_width), the
+    sample size, rows read and seconds spent.
 
-    for age in age_generator:
-        total_age += age
-        user_count += 1
+    method='block' reads random blocks of block_size rows through index
+    seeks until, after at least MIN_BLOCKS blocks, the interval is within
+    +/- target_error, or until time_budget seconds have passed; it is the
+    fast option for interactive use. Seek keys are drawn independently,
+    so two blocks may share rows; the result says so in 'note'.
+    method='bernoulli' keeps each row with probability rate in SQL (the
+    server still scans the table, but only the sample is transferred) and
+    also estimates the row count. method='reservoir' draws sample_size
+    ages uniformly on the client from a full stream_user_ages pass.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    extra = {}
+    if method == 'block':
+        # Blocks are the sampling units: their means are independent draws
+        block_means = RunningStats()
+        rows_read = 0
+        blocks = _age_blocks(block_size, where, rng)
+        try:
+            for ages in blocks:
+                if ages:
+                    block_means.add(sum(ages) / len(ages))
+                    rows_read += len(ages)
+                if block_means.count >= MIN_BLOCKS:
+                    result = mean_estimate(block_means, confidence)
+                    if result['half_width'] <= target_error:
+                        break
+                if time.perf_counter() - started >= time_budget:
+                    break
+        finally:
+            blocks.close()
+        result = mean_estimate(block_means, confidence)
+        extra['note'] = ("blocks are drawn with replacement and may overlap, "
+                         "so the interval can be slightly optimistic")
+    elif method == 'bernoulli':
+        stats = stats_of(sample_user_ages(rate, where))
+        rows_read = stats.count
+        result = mean_estimate(stats, confidence)
+        extra['estimated_count'] = stats.count / rate
+    elif method == 'reservoir':
+        sample = reservoir_sample(stream_user_ages(where=where), sample_size, seed)
+        rows_read = None
+        result = mean_estimate(stats_of(sample), confidence)
+    else:
+        raise ValueError(f"Unknown sampling method: {method}")
+
+    result.update(extra)
+    result.update({
+        'method': method,
+        'rows_read': rows_read,
+        'seconds': time.perf_counter() - started,
+    })
+    return result
+
+def calculate_average_age(pushdown=False, where=None, workers=None):
+    """
+    Calculates the average age from the stream of user ages.
+    With pushdown=True the database computes the average instead, and
+    with workers set the ages are scanned by that many processes.
+    """
+    if workers:
+        stats, _ = parallel_age_stats(workers, where)
+        user_count, average_age = stats.count, stats.mean
+    elif pushdown:
+        stats = aggregate_ages(where)
+        if stats is None:
+            return
+        user_count, average_age = stats['count'], stats['mean']
+    else:
+        total_age = 0
+        user_count = 0
+        for age in stream_user_ages(where=where):
+            total_age += age
+            user_count += 1
+        average_age = total_age / user_count if user_count else None
 
     if user_count > 0:
-        average_age = total_age / user_count
         print(f"Average age of users: {average_age:.2f}")
     else:
         print("No users found.")
 
+def average_age_of(batches):
+    """
+    Returns the average age over batches of user rows, or None if there
+    are none. This is the consumer form of calculate_average_age, for use
+    with shared_scan.
+    """
+    stats = RunningStats()
+    for batch in batches:
+        for user in batch:
+            stats.add(user['age'])
+    return stats.mean if stats.count else None
+
 if __name__ == "__main__":
     calculate_average_age()
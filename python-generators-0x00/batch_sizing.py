@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""
+This module provides adaptive batch sizing for the batch generators:
+the number of rows fetched per round trip is adjusted from the row
+sizes and fetch times observed so far.
+"""
+
+import sys
+
+
+def estimate_row_bytes(rows, sample=5):
+    """
+    Estimates the in-memory size of one row from the first and last few
+    rows of a batch (dicts or sequences of values).
+    """
+    picked = rows[:sample] + rows[-sample:] if len(rows) > 2 * sample else rows
+    total = 0
+    for row in picked:
+        values = row.values() if isinstance(row, dict) else row
+        total += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+    return total / len(picked)
+
+
+class AdaptiveBatchSizer:
+    """
+    Chooses fetchmany sizes that aim at target_bytes of rows per batch and
+    target_seconds per fetch, whichever allows fewer rows.
+
+    Observed row size and per-row fetch time are smoothed with an
+    exponential moving average, and the size changes by at most a factor
+    of two per batch within [min_size, max_size]. on_batch, if given, is
+    called after every batch with a dict describing it.
+    """
+
+    def __init__(self, initial=50, target_bytes=1 << 20, target_seconds=0.05,
+                 min_size=10, max_size=10000, smoothing=0.3, on_batch=None):
+        self.size = max(min_size, min(initial, max_size))
+        self.target_bytes = target_bytes
+        self.target_seconds = target_seconds
+        self.min_size = min_size
+        self.max_size = max_size
+        self.smoothing = smoothing
+        self.on_batch = on_batch
+        self.row_bytes = None
+        self.row_seconds = None
+        self.batches = 0
+        self.rows = 0
+        self.smallest = self.largest = self.size
+
+    def _smooth(self, current, observed):
+        if current is None:
+            return observed
+        return current + self.smoothing * (observed - current)
+
+    def observe(self, rows, seconds):
+        """Records a fetched batch and picks the size of the next one."""
+        if not rows:
+            return self.size
+        count = len(rows)
+        row_bytes = estimate_row_bytes(rows)
+        self.row_bytes = self._smooth(self.row_bytes, row_bytes)
+        self.row_seconds = self._smooth(self.row_seconds, seconds / count)
+
+        by_memory = self.target_bytes / self.row_bytes
+        by_latency = (self.target_seconds / self.row_seconds
+                      if self.row_seconds > 0 else self.max_size)
+        wanted = min(by_memory, by_latency, self.size * 2)
+        wanted = max(wanted, self.size / 2)
+        next_size = int(max(self.min_size, min(wanted, self.max_size)))
+
+        self.batches += 1
+        self.rows += count
+        self.smallest = min(self.smallest, next_size)
+        self.largest = max(self.largest, next_size)
+        if self.on_batch is not None:
+            self.on_batch({
+                'batch_size': count,
+                'seconds': seconds,
+                'row_bytes': row_bytes,
+                'batch_bytes': row_bytes * count,
+                'next_size': next_size,
+            })
+        self.size = next_size
+        return next_size
+
+    def stats(self):
+        """Returns a summary of the sizes chosen so far."""
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'current_size': self.size,
+            'smallest_size': self.smallest,
+            'largest_size': self.largest,
+            'avg_row_bytes': self.row_bytes,
+            'avg_row_seconds': self.row_seconds,
+        }
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""
+This script compares the memory held by user_data rows built as dicts
+(what cursor(dictionary=True) returns), as plain tuples and as
+seed.UserRow objects. It needs no database: the rows are synthesized.
+
+Usage: ./bench_row_memory.py [rows]
+"""
+
+import sys
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+from seed import USER_COLUMNS, UserRow
+
+
+def make_values(count):
+    """Builds the column values of count user_data-shaped rows."""
+    return [
+        [str(uuid.uuid4()), f"User Number {i}", f"user{i}@example.com", Decimal(18 + i % 80)]
+        for i in range(count)
+    ]
+
+
+def measure(build, source):
+    """Returns the bytes allocated by build(source), which is kept alive."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = build(source)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    return after - before
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    source = make_values(count)
+    # The column values are shared by every layout, so only the row
+    # containers themselves are measured.
+    layouts = {
+        'dict': lambda rows: [dict(zip(USER_COLUMNS, row)) for row in rows],
+        'tuple': lambda rows: [tuple(row) for row in rows],
+        'UserRow': lambda rows: [UserRow._make(row) for row in rows],
+    }
+    print(f"Row container memory for {count} rows:")
+    baseline = None
+    for name, build in layouts.items():
+        used = measure(build, source)
+        baseline = baseline or used
+        print(f"  {name:<8} {used / count:8.1f} bytes/row  "
+              f"{used / 2 ** 20:8.1f} MiB total  {used / baseline:5.2f}x dict")
+
+
+if __name__ == "__main__":
+    main()
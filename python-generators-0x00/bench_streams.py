@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+"""
+This script benchmarks the user_data streaming strategies against each
+other: stream_users, stream_users_in_batches, lazy_pagination and
+stream_user_ages, at several batch/page sizes.
+
+It seeds a reproducible synth_data dataset of each requested size,
+either in an embedded SQLite stand-in (the default) or in a local MySQL
+database named ALX_prodev_bench, then runs every strategy in a fresh process and
+records rows/sec, time-to-first-row and peak RSS. Results are appended
+to a JSON-lines file.
+
+Usage: ./bench_streams.py [--backend sqlite|mysql] [--sizes 10000,1000000]
+                          [--batch-sizes 50,1000] [--output FILE]
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import time
+
+import columnar
+import seed
+import sqlite_backend
+import synth_data
+
+BENCH_DATABASE = 'ALX_prodev_bench'
+
+# Walking OFFSET pages is quadratic; past this size it would dominate the run
+OFFSET_PAGINATION_LIMIT = 200000
+
+
+def connect_factory(backend, size, workdir):
+    """Returns a picklable function that opens a connection to the dataset."""
+    if backend == 'sqlite':
+        return functools.partial(sqlite_backend.connect,
+                                 os.path.join(workdir, f"bench_{size}.db"))
+    return functools.partial(seed.connect_to_prodev, BENCH_DATABASE)
+
+
+def seed_dataset(backend, size, workdir, seed_value=42, chunk_rows=100000):
+    """
+    Creates and fills the dataset of the given size unless it exists. The
+    rows come from synth_data, generated and inserted by a pool of
+    processes (a single writer on SQLite).
+    """
+    if backend == 'sqlite':
+        connection = connect_factory(backend, size, workdir)()
+        sqlite_backend.create_table(connection)
+    else:
+        server = seed.connect_db()
+        cursor = server.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {BENCH_DATABASE}")
+        cursor.close()
+        server.close()
+        connection = connect_factory(backend, size, workdir)()
+        seed.create_table(connection)
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    if existing != size:
+        cursor.execute("DELETE FROM user_data")
+        connection.commit()
+    cursor.close()
+    connection.close()
+    if existing != size:
+        print(f"Seeding {size} rows ({backend})...")
+        synth_data.bulk_insert(connect_factory(backend, size, workdir), size,
+                               seed_value=seed_value, chunk_rows=chunk_rows,
+                               workers=1 if backend == 'sqlite' else None)
+
+
+def strategies(size, batch_sizes):
+    """
+    Returns (name, parameter, batched, factory) for every strategy to
+    measure; batched strategies yield lists or batches instead of rows.
+    """
+    stream_users = __import__('0-stream_users').stream_users
+    batches = __import__('1-batch_processing').stream_users_in_batches
+    pagination = __import__('2-lazy_paginate').lazy_pagination
+    ages = __import__('4-stream_ages').stream_user_ages
+    # The pure-Python fallback is measured too, but must not pass for the numpy path
+    columnar_name = ('stream_users_in_batches[columnar]' if columnar.numpy is not None
+                     else 'stream_users_in_batches[columnar, no numpy]')
+
+    runs = [
+        ('stream_users', None, False, lambda: stream_users()),
+        ('stream_users[tuples]', None, False, lambda: stream_users(as_tuples=True)),
+        ('stream_users[UserRow]', None, False,
+         lambda: stream_users(row_factory=seed.UserRow._make)),
+        ('stream_user_ages', None, False, lambda: ages()),
+    ]
+    for n in batch_sizes:
+        runs.append(('stream_users_in_batches', n, True, lambda n=n: batches(n)))
+        runs.append((columnar_name, n, True,
+                     lambda n=n: batches(n, columnar=True)))
+        runs.append(('lazy_pagination[keyset]', n, True,
+                     lambda n=n: pagination(n, keyset=True)))
+        if size <= OFFSET_PAGINATION_LIMIT:
+            runs.append(('lazy_pagination[offset]', n, True,
+                         lambda n=n: pagination(n)))
+    return runs
+
+
+def _measure(factory, batched, results):
+    """
+    Child process: drains one stream and reports its timings, or the
+    error that stopped it. The child is forked, so its peak RSS includes
+    the small parent it started from.
+    """
+    start = time.perf_counter()
+    first_row = None
+    rows = 0
+    try:
+        for item in factory():
+            if first_row is None:
+                first_row = time.perf_counter() - start
+            rows += len(item) if batched else 1
+    except Exception as err:
+        results.put({'error': f"{type(err).__name__}: {err}", 'rows': rows})
+        return
+    elapsed = time.perf_counter() - start
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed > 0 else None,
+        'time_to_first_row': first_row,
+        'peak_rss_mib': peak_kib / 1024,
+    })
+
+
+def _wait_for_result(process, results, poll=1.0):
+    """
+    Returns the record the child puts on results, or an error record if
+    the child dies without one (e.g. killed or crashed in C code).
+    """
+    while True:
+        try:
+            return results.get(timeout=poll)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        try:
+            # The child may have exited right after putting its record
+            return results.get(timeout=poll)
+        except queue.Empty:
+            return {'error': f"child exited with code {process.exitcode} and no result",
+                    'rows': 0}
+
+
+def run_benchmark(backend, sizes, batch_sizes, output, workdir, seed_value=42):
+    """Seeds each dataset, measures every strategy and appends the results."""
+    context = multiprocessing.get_context('fork')
+    with open(output, 'a') as out:
+        for size in sizes:
+            seed_dataset(backend, size, workdir, seed_value)
+            seed.configure_pool(connect=connect_factory(backend, size, workdir))
+            for name, parameter, batched, factory in strategies(size, batch_sizes):
+                results = context.Queue()
+                process = context.Process(target=_measure, args=(factory, batched, results))
+                process.start()
+                record = _wait_for_result(process, results)
+                process.join()
+                record.update({
+                    'strategy': name,
+                    'batch_size': parameter,
+                    'table_rows': size,
+                    'backend': backend,
+                    'python': platform.python_version(),
+                    'timestamp': time.time(),
+                })
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                label = name if parameter is None else f"{name}({parameter})"
+                if 'error' in record:
+                    print(f"{size:>10} {label:<50} Error: {record['error']}")
+                    continue
+                print(f"{size:>10} {label:<50} {record['rows_per_sec'] or 0:>12.0f} rows/s "
+                      f"ttfr {record['time_to_first_row'] or 0:8.4f}s "
+                      f"rss {record['peak_rss_mib']:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--backend', choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument('--sizes', default='10000',
+                        help="comma-separated table sizes, e.g. 10000,1000000,10000000")
+    parser.add_argument('--batch-sizes', default='50,1000',
+                        help="comma-separated batch/page sizes")
+    parser.add_argument('--output', default='bench_results.jsonl')
+    parser.add_argument('--workdir', default='.',
+                        help="directory for the SQLite datasets")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    run_benchmark(args.backend, sizes, batch_sizes, args.output, args.workdir, args.seed)
+
+
+if __name__ == "__main__":
+    main()
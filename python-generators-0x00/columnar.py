@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+"""
+This module provides a columnar representation of user_data batches:
+one contiguous array per column instead of one dict per row.
+
+Numeric columns are stored as float64 arrays and string columns as a
+single UTF-8 buffer plus an offsets array. When numpy is installed the
+filters and aggregates run on numpy views of the same buffers.
+
+numpy is required for columnar mode to be faster than dict rows. Without
+it the same API runs in pure Python, so code using it still works, but
+building and scanning the arrays then costs more than plain rows (about
+twice the time of dict batches at 1,000 rows); only the smaller memory
+footprint remains.
+"""
+
+import itertools
+import math
+import operator
+from array import array
+
+try:
+    import numpy
+except ImportError:  # numpy is optional
+    numpy = None
+
+FLOAT_COLUMNS = ('age',)
+
+_COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+class StringColumn:
+    """
+    A compact column of strings: all values are concatenated into one
+    UTF-8 buffer and offsets[i]:offsets[i + 1] delimits value i.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values):
+        """Packs an iterable of strings into a StringColumn."""
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = array('q', [0])
+        offsets.extend(itertools.accumulate(len(value) for value in encoded))
+        return cls(b''.join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StringColumn index out of range")
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        for start, end in zip(offsets, itertools.islice(offsets, 1, None)):
+            yield str(data[start:end], 'utf-8')
+
+    @property
+    def nbytes(self):
+        """Size of the buffers backing the column, in bytes."""
+        return len(self.data) + len(self.offsets) * self.offsets.itemsize
+
+
+def _flags(mask):
+    """Returns mask as bytes holding one 0/1 flag per row."""
+    if isinstance(mask, array) and mask.itemsize == 1:
+        return mask.tobytes()
+    return bytes(map(bool, mask))
+
+
+def _runs(flags):
+    """Returns the (start, end) ranges of consecutive set flags."""
+    runs = []
+    start = flags.find(1)
+    while start >= 0:
+        end = flags.find(0, start)
+        if end < 0:
+            runs.append((start, len(flags)))
+            break
+        runs.append((start, end))
+        start = flags.find(1, end)
+    return runs
+
+
+def _take(column, flags, runs):
+    """
+    Selects the masked rows of a column in pure Python. flags holds one
+    0/1 byte per row and runs the (start, end) ranges of selected rows;
+    values are copied one slice per run rather than one per row.
+    """
+    if not isinstance(column, StringColumn):
+        values = array('d')
+        for start, end in runs:
+            chunk = column[start:end]
+            if isinstance(chunk, array):
+                values.extend(chunk)
+            else:
+                # A memoryview column (see shared_batches) is copied as raw bytes
+                values.frombytes(chunk.cast('B'))
+        return values
+    data, offsets = column.data, column.offsets.tolist()
+    lengths = map(operator.sub, offsets[1:], offsets)
+    new_offsets = array('q', list(itertools.accumulate(itertools.compress(lengths, flags),
+                                                       initial=0)))
+    return StringColumn(b''.join([data[offsets[start]:offsets[end]] for start, end in runs]),
+                        new_offsets)
+
+
+def _take_numpy(column, mask):
+    """Selects the masked values of a column with numpy fancy indexing."""
+    if not isinstance(column, StringColumn):
+        return array('d', numpy.frombuffer(column, dtype=numpy.float64)[mask].tobytes())
+    offsets = numpy.frombuffer(column.offsets, dtype=numpy.int64)
+    starts = offsets[:-1][mask]
+    lengths = offsets[1:][mask] - starts
+    new_offsets = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=new_offsets[1:])
+    # Byte i of the output comes from starts[row] + (i - new_offsets[row])
+    positions = (numpy.repeat(starts - new_offsets[:-1], lengths)
+                 + numpy.arange(new_offsets[-1], dtype=numpy.int64))
+    data = numpy.frombuffer(column.data, dtype=numpy.uint8)[positions].tobytes()
+    return StringColumn(data, array('q', new_offsets.tobytes()))
+
+
+class ColumnarBatch:
+    """
+    A batch of rows stored column by column. columns maps each column name
+    to a float64 array (FLOAT_COLUMNS) or a StringColumn.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, names, rows):
+        """Builds a batch from row tuples whose values follow names."""
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        columns = {}
+        for name, column in zip(names, values):
+            if name in FLOAT_COLUMNS:
+                columns[name] = array('d', map(float, column))
+            else:
+                columns[name] = StringColumn.from_strings(column)
+        return cls(columns)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def names(self):
+        """Column names in batch order."""
+        return list(self.columns)
+
+    def rows(self):
+        """Yields the batch as row tuples, in column order."""
+        return zip(*self.columns.values())
+
+    def to_dicts(self):
+        """Returns the batch as a list of row dicts."""
+        names = self.names
+        return [dict(zip(names, row)) for row in self.rows()]
+
+    def mask(self, name, op, value):
+        """
+        Compares a float column with value and returns the row mask: a
+        numpy bool array when numpy is installed, else an array('b') of
+        0/1. op is one of =, !=, <, <=, >, >=.
+        """
+        compare = _COMPARISONS[op]
+        column = self.columns[name]
+        if numpy is not None:
+            return compare(numpy.frombuffer(column, dtype=numpy.float64), value)
+        return array('b', bytes(map(compare, column, itertools.repeat(value))))
+
+    def filter(self, mask):
+        """
+        Returns a new batch with only the rows where mask is true. Float
+        values are picked with the mask directly and string columns are
+        rebuilt by copying the selected byte ranges, without decoding.
+        mask can be the result of mask() or any sequence of booleans.
+        """
+        if numpy is not None:
+            mask = numpy.asarray(mask, dtype=bool)
+            return ColumnarBatch({name: _take_numpy(column, mask)
+                                  for name, column in self.columns.items()})
+        flags = _flags(mask)
+        runs = _runs(flags)
+        return ColumnarBatch({name: _take(column, flags, runs)
+                              for name, column in self.columns.items()})
+
+    def where(self, name, op, value):
+        """Shorthand for filter(mask(name, op, value))."""
+        return self.filter(self.mask(name, op, value))
+
+    def sum(self, name):
+        """Sum of a float column."""
+        column = self.columns[name]
+        if numpy is not None:
+            return float(numpy.frombuffer(column, dtype=numpy.float64).sum())
+        return math.fsum(column)
+
+    def mean(self, name):
+        """Mean of a float column, or None for an empty batch."""
+        return self.sum(name) / len(self) if len(self) else None
+
+    @property
+    def nbytes(self):
+        """Size of the buffers backing the batch, in bytes."""
+        return sum(
+            column.nbytes if isinstance(column, StringColumn)
+            else len(column) * column.itemsize
+            for column in self.columns.values()
+        )
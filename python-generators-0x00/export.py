@@ -0,0 +1,331 @@
+#!/usr/bin/python3
+"""
+This script exports user_data to files for other teams.
+
+Rows are read in large batches and each batch is encoded as a whole.
+CSV and NDJSON output is compressed and written by a background thread,
+so gzip runs while the next batch is fetched. The supported formats are
+chosen by file suffix:
+
+    .csv, .csv.gz         CSV with a header row
+    .ndjson, .ndjson.gz   one JSON object per line (.jsonl also works)
+    .ucol                 a plain binary column format, see write_columnar
+    .parquet, .arrow      Parquet or Arrow IPC, when pyarrow is installed
+
+With workers > 1 the table is split as in parallel_scan and every
+partition is exported by its own process to its own part file.
+
+Usage: ./export.py PATH [--workers N] [--batch-size N] [--where-age-over N]
+"""
+
+import argparse
+import csv
+import datetime
+import decimal
+import glob
+import gzip
+import io
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+
+from columnar import ColumnarBatch
+from parallel_scan import map_partitions
+from seed import USER_COLUMNS
+from shared_batches import pack_batch, packed_size, unpack_batch
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional
+    pyarrow = None
+
+UCOL_MAGIC = b'UCOL1\n'
+
+_END = object()
+
+FORMATS = {
+    '.csv': ('csv', False),
+    '.csv.gz': ('csv', True),
+    '.ndjson': ('ndjson', False),
+    '.ndjson.gz': ('ndjson', True),
+    '.jsonl': ('ndjson', False),
+    '.jsonl.gz': ('ndjson', True),
+    '.ucol': ('ucol', False),
+    '.parquet': ('parquet', False),
+    '.arrow': ('arrow', False),
+}
+
+
+def format_of(path):
+    """Returns (format, gzipped) for path, from its suffix."""
+    for suffix in sorted(FORMATS, key=len, reverse=True):
+        if path.endswith(suffix):
+            kind = FORMATS[suffix]
+            if kind[0] in ('parquet', 'arrow') and pyarrow is None:
+                raise ValueError(f"{suffix} export needs pyarrow installed")
+            return kind
+    raise ValueError(f"Unknown export format for {path}; "
+                     f"use one of {', '.join(sorted(FORMATS))}")
+
+
+def _json_value(value):
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class BackgroundWriter:
+    """
+    Writes byte chunks to path on a background thread, through gzip when
+    compress is set. At most depth chunks wait in the queue, so a slow
+    disk or compressor holds the producer back instead of filling memory.
+    Errors from the thread are raised by the next write() or by close().
+    """
+
+    def __init__(self, path, compress=False, compresslevel=6, depth=4):
+        if compress:
+            self._file = gzip.open(path, 'wb', compresslevel=compresslevel)
+        else:
+            self._file = open(path, 'wb')
+        self._chunks = queue.Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='export-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is _END:
+                    break
+                if self._error is None:
+                    self._file.write(chunk)
+        except Exception as err:
+            self._error = err
+            # Keep draining so the producer is never blocked on a full queue
+            while self._chunks.get() is not _END:
+                pass
+        finally:
+            self._file.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, chunk):
+        """Queues one chunk of bytes for writing."""
+        self._raise_error()
+        self._chunks.put(chunk)
+
+    def close(self):
+        """Flushes the queued chunks and closes the file."""
+        self._chunks.put(_END)
+        self._thread.join()
+        self._raise_error()
+
+
+def _csv_bytes(rows, header=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_bytes(rows, names):
+    return ''.join(
+        json.dumps(dict(zip(names, row)), default=_json_value, ensure_ascii=False) + '\n'
+        for row in rows
+    ).encode('utf-8')
+
+
+def write_columnar(stream, batch):
+    """
+    Appends one ColumnarBatch to a .ucol stream: an 8-byte length, the
+    JSON layout of the batch (see shared_batches.pack_batch), an 8-byte
+    length and the packed column buffers. The file starts with UCOL_MAGIC.
+    """
+    body = bytearray(packed_size(batch))
+    layout = json.dumps(pack_batch(batch, body)).encode('utf-8')
+    stream.write(struct.pack('<Q', len(layout)) + layout + struct.pack('<Q', len(body)))
+    stream.write(body)
+
+
+def read_columnar(path):
+    """Yields the ColumnarBatch objects stored in a .ucol file."""
+    with open(path, 'rb') as f:
+        if f.read(len(UCOL_MAGIC)) != UCOL_MAGIC:
+            raise ValueError(f"{path} is not a .ucol file")
+        while True:
+            prefix = f.read(8)
+            if not prefix:
+                return
+            (layout_length,) = struct.unpack('<Q', prefix)
+            layout = json.loads(f.read(layout_length))
+            (body_length,) = struct.unpack('<Q', f.read(8))
+            yield unpack_batch(bytearray(f.read(body_length)), layout)
+
+
+def _arrow_table(names, rows):
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return pyarrow.table({
+        name: [float(value) for value in column] if name == 'age' else list(column)
+        for name, column in zip(names, columns)
+    })
+
+
+def export_batches(batches, path, columns=None, compresslevel=6, queue_depth=4):
+    """
+    Writes batches of row tuples (in the order of columns, the user_data
+    columns by default) to path in the format its suffix names, and
+    returns the number of rows written.
+    """
+    names = tuple(columns) if columns else USER_COLUMNS
+    kind, compress = format_of(path)
+    rows_written = 0
+
+    if kind in ('parquet', 'arrow'):
+        writer = None
+        try:
+            for batch in batches:
+                table = _arrow_table(names, batch)
+                if writer is None:
+                    if kind == 'parquet':
+                        writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+                    else:
+                        writer = pyarrow.ipc.new_file(path, table.schema)
+                writer.write_table(table)
+                rows_written += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows_written
+
+    writer = BackgroundWriter(path, compress, compresslevel, queue_depth)
+    try:
+        if kind == 'csv':
+            writer.write(_csv_bytes((), names))
+        elif kind == 'ucol':
+            writer.write(UCOL_MAGIC)
+        for batch in batches:
+            if kind == 'csv':
+                writer.write(_csv_bytes(batch))
+            elif kind == 'ndjson':
+                writer.write(_ndjson_bytes(batch, names))
+            else:
+                write_columnar(writer, ColumnarBatch.from_rows(names, batch))
+            rows_written += len(batch)
+    finally:
+        writer.close()
+    return rows_written
+
+
+def _tagged(path, tag):
+    """Inserts tag before the format suffix of path."""
+    for suffix in sorted(FORMATS, key=len, reverse=True):
+        if path.endswith(suffix):
+            return f"{path[:-len(suffix)]}{tag}{suffix}"
+    raise ValueError(f"Unknown export format for {path}")
+
+
+def part_path(path, part):
+    """Returns the name of part file number part of an export to path."""
+    return _tagged(path, f"-part-{part:05d}")
+
+
+def _temporary_tag(run):
+    """The tag of the temporary part files of export run run."""
+    return f"-tmp-{run}-"
+
+
+class _PartExporter:
+    """Picklable partition job: exports one partition to a temporary file."""
+
+    def __init__(self, path, columns, compresslevel, run):
+        self.path = path
+        self.columns = columns
+        self.compresslevel = compresslevel
+        self.run = run
+
+    def __call__(self, batches):
+        temporary = _tagged(self.path, f"{_temporary_tag(self.run)}{os.getpid()}")
+        rows = export_batches(batches, temporary, self.columns, self.compresslevel)
+        return temporary, rows
+
+
+def export_users(path, batch_size=10000, columns=None, where=None, workers=1,
+                 compresslevel=6, prefetch=2):
+    """
+    Exports user_data (or the columns/rows selected by columns and where)
+    to path and returns a summary with the rows, files and rows/sec.
+
+    With workers=1 a single file is written while the next batches are
+    prefetched. With workers > 1 every hash partition of the table is
+    exported by its own process, to part files named by part_path. If any
+    partition fails, every file of the run is removed before the error is
+    raised, so a failed export never leaves a partial set of parts.
+    """
+    format_of(path)
+    started = time.perf_counter()
+    if workers > 1:
+        run = uuid.uuid4().hex[:12]
+        files = []
+        try:
+            results = map_partitions(_PartExporter(path, columns, compresslevel, run),
+                                     workers, batch_size, columns=columns, where=where,
+                                     as_tuples=True)
+            for part, (temporary, _) in enumerate(results):
+                files.append(part_path(path, part))
+                os.replace(temporary, files[-1])
+        except BaseException:
+            # Includes the temporary files of workers that died mid-export
+            leftovers = glob.glob(_tagged(glob.escape(path), f"{_temporary_tag(run)}*"))
+            for leftover in leftovers + files:
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+            raise
+        rows = sum(count for _, count in results)
+    else:
+        stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+        batches = stream_users_in_batches(batch_size, columns, where, prefetch=prefetch,
+                                          row_factory=tuple)
+        rows = export_batches(batches, path, columns, compresslevel)
+        files = [path]
+    seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'files': files,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', help="output file; its suffix picks the format")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--where-age-over', type=float, default=None)
+    parser.add_argument('--compresslevel', type=int, default=6)
+    args = parser.parse_args()
+
+    where = None if args.where_age_over is None else [('age', '>', args.where_age_over)]
+    summary = export_users(args.path, args.batch_size, where=where, workers=args.workers,
+                           compresslevel=args.compresslevel)
+    print(f"Exported {summary['rows']} rows to {len(summary['files'])} file(s) "
+          f"in {summary['seconds']:.2f}s ({summary['rows_per_sec'] or 0:.0f} rows/sec).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Shared test data: a small deterministic user_data table loaded into the
+SQLite stand-in, so the generators can be tested without MySQL.
+"""
+import functools
+import os
+import random
+import tempfile
+import uuid
+
+import seed
+import sqlite_backend
+
+USER_COUNT = 500
+
+_rng = random.Random(42)
+
+# 50 emails are shared by two users, for the dedupe and distinct counts
+USERS = [
+    (str(uuid.UUID(int=_rng.getrandbits(128), version=4)),
+     f"User {i}", f"user{i % 450}@example.com", 18 + (i * 7) % 63)
+    for i in range(USER_COUNT)
+]
+
+
+def use_sqlite_users(test_class):
+    """
+    Loads USERS into a temporary SQLite stand-in and points the shared
+    pool at it. Call from setUpClass; undo with drop_sqlite_users.
+    """
+    test_class._workdir = tempfile.TemporaryDirectory()
+    path = os.path.join(test_class._workdir.name, 'users.db')
+    connection = sqlite_backend.connect(path)
+    sqlite_backend.create_table(connection)
+    cursor = connection.cursor()
+    cursor.executemany(
+        "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
+        USERS)
+    cursor.close()
+    connection.commit()
+    connection.close()
+    seed.configure_pool(connect=functools.partial(sqlite_backend.connect, path))
+
+
+def drop_sqlite_users(test_class):
+    """Closes the pool and removes the database of use_sqlite_users."""
+    seed.get_pool().close()
+    test_class._workdir.cleanup()
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+"""
+This module provides opt-in throughput and back-pressure instrumentation
+for the generator streams.
+
+Every public generator is wrapped with @instrumented, which adds a
+metrics keyword argument. Without it the generator is returned
+untouched, so the default path pays nothing. With metrics=True,
+metrics=callback or metrics=StreamMetrics(...) the stream is timed
+item by item:
+
+* fetch time is spent inside the generator, waiting for the next row or
+  batch (fetchmany, row building, or an empty prefetch queue);
+* consumer time is spent in the caller's loop body between two items.
+
+A high fetch share means the database or network is the bottleneck, a
+high consumer share means the job itself is. Reports go to the
+'instrumentation' logger and, if given, to the metrics callback.
+"""
+
+import functools
+import logging
+import sys
+import time
+
+from batch_sizing import estimate_row_bytes
+from columnar import ColumnarBatch
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Single rows are measured one in this many; the others reuse the average
+ROW_SAMPLE_EVERY = 100
+
+
+def _batch_size_of(item):
+    """Returns (rows, bytes) for one item of a stream: a batch or a row."""
+    if isinstance(item, ColumnarBatch):
+        return len(item), item.nbytes
+    if isinstance(item, list):
+        return len(item), estimate_row_bytes(item) * len(item) if item else 0
+    return 1, None
+
+
+class StreamMetrics:
+    """
+    Counters for one instrumented stream.
+
+    on_report, if given, is called with a report dict (see report()) every
+    report_every seconds while the stream runs, when report_every is set,
+    and once at the end. log=False keeps the reports out of the log.
+    """
+
+    def __init__(self, name='stream', on_report=None, report_every=None, log=True):
+        self.name = name
+        self.on_report = on_report
+        self.report_every = report_every
+        self.log = log
+        self.items = 0
+        self.rows = 0
+        self.bytes = 0
+        self.fetch_seconds = 0.0
+        self.consumer_seconds = 0.0
+        self.max_latency = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._row_bytes = None
+        self._started = None
+        self._last_report = None
+
+    def start(self):
+        """Marks the start of the stream."""
+        self._started = self._last_report = time.perf_counter()
+
+    def record_fetch(self, item, seconds):
+        """Records one item and the time the generator took to produce it."""
+        self.items += 1
+        self.fetch_seconds += seconds
+        self.max_latency = max(self.max_latency, seconds)
+        milliseconds = seconds * 1000
+        for bucket, bound in enumerate(LATENCY_BUCKETS_MS):
+            if milliseconds <= bound:
+                self.histogram[bucket] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+        rows, size = _batch_size_of(item)
+        if size is None:
+            if self._row_bytes is None or self.items % ROW_SAMPLE_EVERY == 0:
+                values = item.values() if isinstance(item, dict) else (
+                    item if isinstance(item, tuple) else ())
+                self._row_bytes = sys.getsizeof(item) + sum(map(sys.getsizeof, values))
+            size = self._row_bytes
+        self.rows += rows
+        self.bytes += size
+
+        if self.report_every and self.on_report is not None:
+            now = time.perf_counter()
+            if now - self._last_report >= self.report_every:
+                self._last_report = now
+                self.on_report(self.report())
+
+    def record_consumer(self, seconds):
+        """Records time the consumer spent between two items."""
+        self.consumer_seconds += seconds
+
+    def report(self, final=False):
+        """Returns the counters as a dict, with rates over the elapsed time."""
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        busy = self.fetch_seconds + self.consumer_seconds
+        histogram = {f"le_{bound}ms": count
+                     for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram)}
+        histogram['inf'] = self.histogram[-1]
+        return {
+            'name': self.name,
+            'final': final,
+            'seconds': elapsed,
+            'items': self.items,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_sec': self.rows / elapsed if elapsed else None,
+            'bytes_per_sec': self.bytes / elapsed if elapsed else None,
+            'fetch_seconds': self.fetch_seconds,
+            'consumer_seconds': self.consumer_seconds,
+            'fetch_share': self.fetch_seconds / busy if busy else None,
+            'mean_latency': self.fetch_seconds / self.items if self.items else None,
+            'max_latency': self.max_latency,
+            'latency_histogram': histogram,
+        }
+
+    def finish(self):
+        """Emits the final report to the log and the callback, and returns it."""
+        report = self.report(final=True)
+        if self.log:
+            logger.info(
+                "%s: %d rows (%d items) in %.2fs, %.0f rows/s, %.2f MB/s; "
+                "fetch %.2fs, consumer %.2fs, max latency %.1fms",
+                self.name, report['rows'], report['items'], report['seconds'],
+                report['rows_per_sec'] or 0, (report['bytes_per_sec'] or 0) / 1e6,
+                report['fetch_seconds'], report['consumer_seconds'],
+                report['max_latency'] * 1000)
+        if self.on_report is not None:
+            self.on_report(report)
+        return report
+
+
+def instrument(iterable, metrics):
+    """
+    Yields the items of iterable while recording, in metrics, how long
+    each one took to produce and how long the consumer held it.
+    """
+    iterator = iter(iterable)
+    metrics.start()
+    handed_out = None
+    try:
+        while True:
+            started = time.perf_counter()
+            if handed_out is not None:
+                metrics.record_consumer(started - handed_out)
+                handed_out = None
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            handed_out = time.perf_counter()
+            metrics.record_fetch(item, handed_out - started)
+            yield item
+    finally:
+        if handed_out is not None:
+            # The consumer stopped early while holding the last item
+            metrics.record_consumer(time.perf_counter() - handed_out)
+        if hasattr(iterator, 'close'):
+            iterator.close()
+        metrics.finish()
+
+
+def _metrics_for(metrics, name):
+    if isinstance(metrics, StreamMetrics):
+        return metrics
+    if callable(metrics):
+        return StreamMetrics(name, on_report=metrics)
+    return StreamMetrics(name)
+
+
+def instrumented(generator):
+    """
+    Adds a metrics keyword argument to a generator function: None (the
+    default) leaves the stream untouched, True logs a report at the end,
+    a callable also receives the report dict, and a StreamMetrics
+    instance is used as is (e.g. to set report_every).
+    """
+    @functools.wraps(generator)
+    def wrapper(*args, metrics=None, **kwargs):
+        stream = generator(*args, **kwargs)
+        if not metrics:
+            return stream
+        return instrument(stream, _metrics_for(metrics, generator.__name__))
+    return wrapper
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+"""
+This module provides a bounded-memory sort-merge join between user_data
+streams and external CSV files keyed by user_id.
+
+Both inputs are consumed in key order: the table through
+stream_users_in_batches(order_by='user_id'), the file either as is (when
+it is already sorted) or through an external sort that spills sorted
+runs to temporary files. Only the rows of the current key are held in
+memory.
+"""
+
+import csv
+import heapq
+import itertools
+import os
+import tempfile
+
+from sketches import key_getter
+
+_MISSING = object()
+
+
+def read_sorted_csv(path, key='user_id'):
+    """
+    Yields the rows of a CSV file (as dicts) that is already sorted by
+    key, raising ValueError as soon as a row is out of order.
+    """
+    with open(path, 'r', newline='') as f:
+        previous = _MISSING
+        for row in csv.DictReader(f):
+            current = row[key]
+            if previous is not _MISSING and current < previous:
+                raise ValueError(f"{path} is not sorted by {key}: "
+                                 f"{current!r} follows {previous!r}")
+            previous = current
+            yield row
+
+
+def _write_run(rows, fieldnames, tmpdir):
+    handle, run_path = tempfile.mkstemp(prefix='sortrun-', suffix='.csv', dir=tmpdir)
+    with os.fdopen(handle, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    return run_path
+
+
+def _read_run(run_path):
+    with open(run_path, 'r', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def external_sort_csv(path, key='user_id', chunk_rows=100000, tmpdir=None):
+    """
+    Yields the rows of a CSV file sorted by key, holding at most
+    chunk_rows rows in memory. Each chunk is sorted and spilled to a
+    temporary file, and the runs are merged with heapq.merge. The
+    temporary files are removed when the generator finishes or is closed.
+    """
+    runs = []
+    try:
+        with open(path, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames
+            while True:
+                chunk = list(itertools.islice(reader, chunk_rows))
+                if not chunk:
+                    break
+                chunk.sort(key=lambda row: row[key])
+                if not runs and len(chunk) < chunk_rows:
+                    # Everything fits in one chunk: no need to spill
+                    yield from chunk
+                    return
+                runs.append(_write_run(chunk, fieldnames, tmpdir))
+        yield from heapq.merge(*(_read_run(run) for run in runs),
+                               key=lambda row: row[key])
+    finally:
+        for run_path in runs:
+            try:
+                os.remove(run_path)
+            except OSError:
+                pass
+
+
+def _checked(rows, get_key, side):
+    """Yields (key, row) pairs, raising ValueError if keys go backwards."""
+    previous = _MISSING
+    for row in rows:
+        current = get_key(row)
+        if previous is not _MISSING and current < previous:
+            raise ValueError(f"{side} input is not sorted: "
+                             f"{current!r} follows {previous!r}")
+        previous = current
+        yield current, row
+
+
+def merge_join(left, right, left_key='user_id', right_key='user_id', how='inner'):
+    """
+    Joins two iterables of rows that are both sorted ascending by their
+    keys and yields (left_row, right_row) pairs.
+
+    how='inner' yields only matching pairs; how='left' also yields
+    (left_row, None) for left rows without a match. Every combination of
+    rows sharing a key is produced, and only the right rows of the
+    current key are buffered.
+    """
+    if how not in ('inner', 'left'):
+        raise ValueError(f"Unsupported join type: {how}")
+    left_rows = _checked(left, key_getter(left_key), 'left')
+    right_rows = _checked(right, key_getter(right_key), 'right')
+
+    pending = next(right_rows, None)
+    group_key, group = _MISSING, []
+    for key, left_row in left_rows:
+        if group_key is _MISSING or key != group_key:
+            while pending is not None and pending[0] < key:
+                pending = next(right_rows, None)
+            group_key, group = key, []
+            while pending is not None and pending[0] == key:
+                group.append(pending[1])
+                pending = next(right_rows, None)
+        if group:
+            for right_row in group:
+                yield left_row, right_row
+        elif how == 'left':
+            yield left_row, None
+
+
+def enrich_users(csv_path, key='user_id', presorted=False, how='left',
+                 batch_size=1000, chunk_rows=100000, tmpdir=None, **stream_options):
+    """
+    Joins user_data with an external CSV keyed by key (user_id by default)
+    and yields (user, csv_row) pairs in user_id order.
+
+    The users are read with stream_users_in_batches(order_by='user_id').
+    Set presorted=True if the file is already sorted by key, otherwise it
+    is sorted externally in chunks of chunk_rows. The comparison is done
+    in Python, so the table's collation must order user_id like Python
+    compares strings; this holds for the lowercase UUIDs seed.py loads.
+    """
+    stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+    batches = stream_users_in_batches(batch_size, order_by='user_id', **stream_options)
+    users = itertools.chain.from_iterable(batches)
+    if presorted:
+        external = read_sorted_csv(csv_path, key)
+    else:
+        external = external_sort_csv(csv_path, key, chunk_rows, tmpdir)
+    try:
+        yield from merge_join(users, external, 'user_id', key, how)
+    finally:
+        batches.close()
+        external.close()
@@ -0,0 +1,277 @@
+#!/usr/bin/python3
+"""
+This module provides a partitioned, multi-process scan of user_data.
+
+The table is split into partitions of user_id, either hash buckets
+(MOD(CRC32(user_id), n)) or contiguous key ranges. Each partition is
+scanned by its own process on its own pooled connection, and the batches
+are merged back into a single stream in the parent.
+
+Workers build their pool from the parent's configure_pool options, which
+are passed to them explicitly, so a pool pointed at a replica or at the
+SQLite stand-in is honoured under the spawn and forkserver start methods
+too (its connect factory must then be picklable, e.g. a functools.partial).
+"""
+
+import heapq
+import multiprocessing
+import traceback
+from queue import Empty
+
+import seed
+from instrumentation import instrumented
+from seed import (USER_COLUMNS, build_select, build_where, close_cursor,
+                  get_connection, release_connection)
+
+# Seconds between checks that the workers are still alive
+POLL_INTERVAL = 1.0
+
+_DONE = '__done__'
+_ERROR = '__error__'
+
+
+def partition_conditions(partitions, mode='hash'):
+    """
+    Returns one (sql, params) condition per partition.
+
+    mode='hash' buckets rows by MOD(CRC32(user_id), partitions).
+    mode='range' splits the key space on the first eight hex digits of
+    user_id, which assumes the lowercase UUID keys that seed.py loads;
+    ranges come back in key order.
+    """
+    if partitions < 1:
+        raise ValueError("partitions must be at least 1")
+    if mode == 'hash':
+        return [("MOD(CRC32(user_id), %s) = %s", (partitions, bucket))
+                for bucket in range(partitions)]
+    if mode == 'range':
+        space = 16 ** 8
+        bounds = [format(space * i // partitions, '08x') for i in range(partitions)]
+        conditions = []
+        for i, lower in enumerate(bounds):
+            # The outer partitions are open-ended, so keys outside the
+            # hex space (e.g. sorting below '0') are never dropped
+            if partitions == 1:
+                conditions.append(("1 = 1", ()))
+            elif i == 0:
+                conditions.append(("user_id < %s", (bounds[1],)))
+            elif i + 1 < partitions:
+                conditions.append(("user_id >= %s AND user_id < %s",
+                                   (lower, bounds[i + 1])))
+            else:
+                conditions.append(("user_id >= %s", (lower,)))
+        return conditions
+    raise ValueError(f"Unknown partition mode: {mode}")
+
+
+def partition_queries(partitions, mode='hash', columns=None, where=None, ordered=False):
+    """Returns the (query, params) that scans each partition."""
+    select, _ = build_select(columns)
+    clause, params = build_where(where)
+    queries = []
+    for condition, condition_params in partition_conditions(partitions, mode):
+        joiner = " AND " if clause else " WHERE "
+        query = select + clause + joiner + condition
+        if ordered:
+            query += " ORDER BY user_id"
+        queries.append((query, params + tuple(condition_params)))
+    return queries
+
+
+def _partition_batches(query, params, batch_size, as_tuples):
+    """Streams one partition on a connection of the current process."""
+    connection = get_connection()
+    if not connection:
+        raise RuntimeError("could not connect to ALX_prodev")
+    cursor = None
+    try:
+        cursor = connection.cursor(buffered=False, dictionary=not as_tuples)
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+    finally:
+        close_cursor(cursor)
+        release_connection(connection)
+
+
+def _scan_partition(tag, query, params, batch_size, as_tuples, out):
+    """Worker: streams one partition into the out queue in batches."""
+    try:
+        for batch in _partition_batches(query, params, batch_size, as_tuples):
+            out.put((tag, batch))
+        out.put((tag, _DONE))
+    except Exception:
+        out.put((tag, (_ERROR, traceback.format_exc())))
+
+
+def _map_partition(tag, func, query, params, batch_size, as_tuples, out):
+    """Worker: runs func over the batches of one partition, sends the result."""
+    try:
+        out.put((tag, func(_partition_batches(query, params, batch_size, as_tuples))))
+    except Exception:
+        out.put((tag, (_ERROR, traceback.format_exc())))
+
+
+def _get(queue, processes, pending):
+    """
+    Returns the next (tag, item) from queue, checking every POLL_INTERVAL
+    that the workers of the pending partitions are still alive. Raises
+    RuntimeError naming the partition whose worker exited without
+    finishing (e.g. killed for memory or crashed in C code).
+    """
+    while True:
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            pass
+        dead = [tag for tag in pending if not processes[tag].is_alive()]
+        if dead:
+            try:
+                # A worker may have exited right after putting its last item
+                return queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                tag = dead[0]
+                raise RuntimeError(
+                    f"Partition {tag} worker exited with code "
+                    f"{processes[tag].exitcode} before finishing") from None
+
+
+def _queue_batches(queue, processes, tag):
+    """Yields the batches a single worker puts on queue until it is done."""
+    while True:
+        _, item = _get(queue, processes, (tag,))
+        if item == _DONE:
+            return
+        _raise_if_error(item)
+        yield item
+
+
+def _raise_if_error(item):
+    if isinstance(item, tuple) and len(item) == 2 and item[0] == _ERROR:
+        raise RuntimeError(f"Partition scan failed:\n{item[1]}")
+
+
+def _run_worker(pool_options, target, args):
+    """Worker entry point: builds the parent's pool, then runs target."""
+    seed.configure_pool(**pool_options)
+    target(*args)
+
+
+def _start_workers(target, arguments):
+    """
+    Starts one daemon process per argument tuple, each with a pool built
+    from the parent's configure_pool options.
+    """
+    pool_options = seed.pool_options()
+    processes = []
+    for args in arguments:
+        process = multiprocessing.Process(target=_run_worker,
+                                          args=(pool_options, target, args))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def _stop_workers(processes):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+@instrumented
+def parallel_stream_users_in_batches(workers=4, batch_size=1000, mode='hash',
+                                     ordered=False, columns=None, where=None,
+                                     as_tuples=False):
+    """
+    Scans user_data with one process per partition and yields batches.
+
+    With ordered=False batches are yielded as soon as any worker produces
+    them. With ordered=True every partition is read in user_id order and
+    the partitions are merged, so the stream comes out in user_id order
+    (user_id must then be one of the selected columns).
+    """
+    queries = partition_queries(workers, mode, columns, where, ordered)
+    if ordered:
+        yield from _ordered_scan(queries, batch_size, columns, as_tuples)
+        return
+
+    out = multiprocessing.Queue(maxsize=workers * 4)
+    processes = _start_workers(
+        _scan_partition,
+        [(tag, query, params, batch_size, as_tuples, out)
+         for tag, (query, params) in enumerate(queries)])
+    try:
+        pending = set(range(len(processes)))
+        while pending:
+            tag, item = _get(out, processes, pending)
+            if item == _DONE:
+                pending.discard(tag)
+                continue
+            _raise_if_error(item)
+            yield item
+    finally:
+        _stop_workers(processes)
+
+
+def _ordered_scan(queries, batch_size, columns, as_tuples):
+    names = tuple(columns) if columns else USER_COLUMNS
+    if 'user_id' not in names:
+        raise ValueError("ordered scans need user_id among the columns")
+    if as_tuples:
+        position = names.index('user_id')
+        key = lambda row: row[position]
+    else:
+        key = lambda row: row['user_id']
+
+    partition_queues = [multiprocessing.Queue(maxsize=4) for _ in queries]
+    processes = _start_workers(
+        _scan_partition,
+        [(tag, query, params, batch_size, as_tuples, partition_queues[tag])
+         for tag, (query, params) in enumerate(queries)])
+    try:
+        streams = [
+            (row for batch in _queue_batches(queue, processes, tag) for row in batch)
+            for tag, queue in enumerate(partition_queues)
+        ]
+        batch = []
+        for row in heapq.merge(*streams, key=key):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        _stop_workers(processes)
+
+
+def map_partitions(func, workers=4, batch_size=1000, mode='hash',
+                   columns=None, where=None, as_tuples=False):
+    """
+    Runs func(batches) in one process per partition and returns the list
+    of results, one per partition. func must be a picklable module-level
+    function; combine the partial results in the caller (e.g. with
+    RunningStats.merge).
+    """
+    queries = partition_queries(workers, mode, columns, where)
+    out = multiprocessing.Queue()
+    processes = _start_workers(
+        _map_partition,
+        [(tag, func, query, params, batch_size, as_tuples, out)
+         for tag, (query, params) in enumerate(queries)])
+    try:
+        results = [None] * len(processes)
+        pending = set(range(len(processes)))
+        while pending:
+            tag, item = _get(out, processes, pending)
+            _raise_if_error(item)
+            results[tag] = item
+            pending.discard(tag)
+        return results
+    finally:
+        _stop_workers(processes)
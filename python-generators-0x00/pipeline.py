@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+"""
+This module provides a small lazy pipeline layer over the user_data
+generators:
+
+    (Pipeline(stream_users())
+        .filter(lambda u: u['age'] > 25)
+        .map(lambda u: (u['user_id'], u['email']))
+        .to_csv('emails.csv', columns=['user_id', 'email']))
+
+Nothing runs until the pipeline is iterated or sent to a sink. Runs of
+consecutive filter/map stages are fused into a single loop over the
+rows, so no intermediate list or per-stage generator is created, and
+sinks write in bulk, one chunk at a time, so a job keeps a constant
+footprint however many rows it handles.
+"""
+
+import collections
+import csv
+import functools
+import itertools
+import json
+import re
+
+from seed import get_connection, release_connection
+
+_MAP = 'map'
+_FILTER = 'filter'
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _fused(rows, stages):
+    """Applies a run of map/filter stages to rows in one loop."""
+    for row in rows:
+        for kind, func in stages:
+            if kind == _MAP:
+                row = func(row)
+            elif not func(row):
+                break
+        else:
+            yield row
+
+
+def _batched(rows, size):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _windowed(rows, size, step):
+    """Yields tuples of size consecutive rows, starting every step rows."""
+    window = collections.deque(maxlen=size)
+    for index, row in enumerate(rows):
+        window.append(row)
+        if index >= size - 1 and (index - size + 1) % step == 0:
+            yield tuple(window)
+
+
+def _check_identifier(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name}")
+    return name
+
+
+class Pipeline:
+    """
+    A lazy chain of stages over an iterable of rows.
+
+    filter, map, flatten, batch, window and take each return a new
+    Pipeline; iterating it (or calling a sink) runs the whole chain once.
+    A pipeline over a generator can only be consumed once.
+    """
+
+    def __init__(self, source, stages=()):
+        self.source = source
+        self.stages = tuple(stages)
+
+    def _then(self, kind, func):
+        return Pipeline(self.source, self.stages + ((kind, func),))
+
+    def filter(self, predicate):
+        """Keeps the rows for which predicate(row) is true."""
+        return self._then(_FILTER, predicate)
+
+    def map(self, func):
+        """Replaces each row by func(row)."""
+        return self._then(_MAP, func)
+
+    def flatten(self):
+        """Turns a stream of batches (e.g. stream_users_in_batches) into rows."""
+        return self._then('flatten', itertools.chain.from_iterable)
+
+    def batch(self, size):
+        """Groups rows into lists of at most size rows."""
+        return self._then('batch', functools.partial(_batched, size=size))
+
+    def window(self, size, step=None):
+        """
+        Groups rows into tuples of size consecutive rows. step defaults to
+        size (tumbling windows); a smaller step gives sliding windows.
+        """
+        step = step or size
+        return self._then('window', functools.partial(_windowed, size=size, step=step))
+
+    def take(self, count):
+        """Stops after count rows."""
+        return self._then('take', lambda rows: itertools.islice(rows, count))
+
+    def __iter__(self):
+        source = iter(self.source)
+        rows = source
+        run = []
+        for kind, func in self.stages:
+            if kind in (_MAP, _FILTER):
+                run.append((kind, func))
+                continue
+            if run:
+                rows = _fused(rows, run)
+                run = []
+            rows = func(rows)
+        if run:
+            rows = _fused(rows, run)
+        try:
+            yield from rows
+        finally:
+            # Return the source's connection even when a take() stops early
+            if hasattr(source, 'close'):
+                source.close()
+
+    def collect(self):
+        """Runs the pipeline and returns its rows as a list."""
+        return list(self)
+
+    def count(self):
+        """Runs the pipeline and returns the number of rows it produced."""
+        return sum(1 for _ in self)
+
+    def reduce(self, func, initial):
+        """Folds the rows into a single value with func(accumulator, row)."""
+        return functools.reduce(func, self, initial)
+
+    def _chunks(self, chunk_size):
+        """The rows, as lists of chunk_size, ready for bulk writes."""
+        return _batched(self, chunk_size)
+
+    def to_csv(self, path, columns=None, chunk_size=1000):
+        """
+        Writes the rows to a CSV file and returns how many were written.
+        Dict rows are written under columns (their keys by default) with
+        a header, and keys outside columns are left out; tuple rows get a
+        header only if columns is given.
+        """
+        written = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = None
+            for chunk in self._chunks(chunk_size):
+                if writer is None:
+                    if isinstance(chunk[0], dict):
+                        writer = csv.DictWriter(f, fieldnames=columns or list(chunk[0]),
+                                                extrasaction='ignore')
+                        writer.writeheader()
+                    else:
+                        writer = csv.writer(f)
+                        if columns:
+                            writer.writerow(columns)
+                writer.writerows(chunk)
+                written += len(chunk)
+        return written
+
+    def to_jsonl(self, path, chunk_size=1000):
+        """Writes the rows as JSON lines and returns how many were written."""
+        written = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in self._chunks(chunk_size):
+                f.write(''.join(json.dumps(row, default=str) + '\n' for row in chunk))
+                written += len(chunk)
+        return written
+
+    def to_table(self, table, columns=None, connection=None, chunk_size=1000):
+        """
+        Inserts the rows into table with one multi-row executemany and one
+        commit per chunk_size rows, and returns how many were inserted.
+
+        Dict rows are inserted under columns (their keys by default);
+        tuple rows need columns. The rows go through connection if given,
+        else through a pooled connection.
+        """
+        pooled = connection is None
+        if pooled:
+            connection = get_connection()
+            if not connection:
+                raise RuntimeError("could not connect to the database")
+        cursor = None
+        inserted = 0
+        try:
+            cursor = connection.cursor()
+            query = None
+            for chunk in self._chunks(chunk_size):
+                if query is None:
+                    if columns is None:
+                        if not isinstance(chunk[0], dict):
+                            raise ValueError("columns are required for tuple rows")
+                        columns = list(chunk[0])
+                    names = [_check_identifier(column) for column in columns]
+                    query = (f"INSERT INTO {_check_identifier(table)} ({', '.join(names)}) "
+                             f"VALUES ({', '.join(['%s'] * len(names))})")
+                if isinstance(chunk[0], dict):
+                    chunk = [tuple(row[column] for column in columns) for row in chunk]
+                cursor.executemany(query, chunk)
+                connection.commit()
+                inserted += len(chunk)
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if pooled:
+                release_connection(connection)
+        return inserted
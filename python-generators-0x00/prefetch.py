@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""
+This module provides a read-ahead wrapper that runs a generator in a
+background thread, so the next batches are fetched from the database
+while the consumer is still working on the current one.
+"""
+
+import queue
+import threading
+
+_END = object()
+
+
+def read_ahead(iterable, depth=2):
+    """
+    Yields the items of iterable while a background thread keeps up to
+    depth items fetched ahead in a bounded queue.
+
+    Exceptions raised by the source are re-raised in the consumer. When
+    the consumer stops early (GeneratorExit), the producer thread is told
+    to stop, closes the source in its own thread and is joined, so the
+    source's cleanup (e.g. returning its connection) always runs.
+    """
+    if depth < 1:
+        yield from iterable
+        return
+
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((_END, None))
+        except BaseException as err:
+            put((_END, err))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name='read-ahead', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
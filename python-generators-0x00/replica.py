@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+"""
+This module keeps a local SQLite mirror of user_data for read-heavy
+analytics.
+
+The first refresh copies the whole table from the ALX_prodev primary;
+later refreshes copy only the rows changed since the last one, using the
+(updated_at, user_id) change stream of stream_changes. The high-water
+mark is stored in the mirror itself, in the same transaction as the rows
+it covers. use_replica() points the shared connection pool at the
+mirror, so every generator in this project reads from local disk.
+
+Rows deleted on the primary are not seen by incremental refreshes; run
+with --full (or full=True) to rebuild the mirror from scratch.
+
+Usage: ./replica.py PATH [--interval SECONDS] [--full] [--batch-size N]
+"""
+
+import argparse
+import functools
+import threading
+import time
+
+import seed
+import sqlite_backend
+from stream_changes import CHANGE_COLUMNS, fetch_changes_after, watermark_of
+
+# Serve the filters and aggregates analysts run most: by age and by email
+ANALYTICS_INDEXES = {
+    'idx_user_data_age': '(age)',
+    'idx_user_data_email': '(email)',
+}
+
+_UPSERT = (f"INSERT OR REPLACE INTO user_data ({', '.join(CHANGE_COLUMNS)}) "
+           f"VALUES ({', '.join(['%s'] * len(CHANGE_COLUMNS))})")
+
+
+def create_replica(path):
+    """
+    Opens the mirror at path, creating user_data, its analytics indexes
+    and the table holding the refresh watermark if needed.
+    """
+    connection = sqlite_backend.connect(path)
+    sqlite_backend.create_table(connection)
+    cursor = connection.cursor()
+    for name, columns in ANALYTICS_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON user_data {columns}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS replica_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            updated_at TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            refreshed_at TEXT NOT NULL
+        )
+    """)
+    cursor.close()
+    connection.commit()
+    return connection
+
+
+def replica_watermark(connection):
+    """Returns the watermark of the last refresh, or None for an empty mirror."""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SELECT updated_at, user_id FROM replica_state WHERE id = 1")
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def _mirror_row(row):
+    values = [row[column] for column in CHANGE_COLUMNS]
+    values[CHANGE_COLUMNS.index('age')] = float(row['age'])
+    values[CHANGE_COLUMNS.index('updated_at')] = watermark_of(row)['updated_at']
+    return values
+
+
+def refresh_replica(path, source=None, batch_size=10000, full=False):
+    """
+    Brings the mirror at path up to date with the primary and returns a
+    summary of the refresh.
+
+    source is a callable opening a connection to the primary
+    (seed.connect_to_prodev by default); it is used directly rather than
+    through the shared pool, which may point at the mirror. Each batch is
+    committed together with its watermark, so an interrupted refresh
+    resumes where it stopped. full=True empties the mirror first.
+    """
+    started = time.perf_counter()
+    replica = create_replica(path)
+    primary = (source or seed.connect_to_prodev)()
+    if not primary:
+        replica.close()
+        raise RuntimeError("could not connect to the primary database")
+
+    copied = 0
+    try:
+        cursor = replica.cursor()
+        if full:
+            cursor.execute("DELETE FROM user_data")
+            cursor.execute("DELETE FROM replica_state")
+            replica.commit()
+        watermark = replica_watermark(replica)
+        while True:
+            rows = fetch_changes_after(watermark, batch_size, connection=primary)
+            if not rows:
+                break
+            cursor.executemany(_UPSERT, [_mirror_row(row) for row in rows])
+            watermark = watermark_of(rows[-1])
+            cursor.execute(
+                "INSERT OR REPLACE INTO replica_state (id, updated_at, user_id, refreshed_at) "
+                f"VALUES (1, %s, %s, {sqlite_backend.TIMESTAMP_NOW})",
+                (watermark['updated_at'], watermark['user_id']))
+            replica.commit()
+            copied += len(rows)
+        cursor.close()
+    finally:
+        primary.close()
+        replica.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows': copied,
+        'watermark': watermark,
+        'seconds': seconds,
+        'rows_per_sec': copied / seconds if seconds else None,
+    }
+
+
+def use_replica(path):
+    """Points the shared connection pool (and every generator) at the mirror."""
+    return seed.configure_pool(connect=functools.partial(sqlite_backend.connect, path))
+
+
+def use_primary():
+    """Points the shared connection pool back at the ALX_prodev primary."""
+    return seed.configure_pool()
+
+
+class ReplicaRefresher(threading.Thread):
+    """
+    A background thread that refreshes the mirror every interval seconds
+    until stop() is called. Failed refreshes are reported and retried at
+    the next interval; last holds the summary of the latest refresh.
+    """
+
+    def __init__(self, path, interval=60, **options):
+        super().__init__(name='replica-refresher', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.options = options
+        self.last = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.last = refresh_replica(self.path, **self.options)
+            except Exception as err:
+                print(f"Error refreshing replica {self.path}: {err}")
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        """Stops the thread after the refresh in progress, if any."""
+        self._stopped.set()
+        self.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', help="SQLite file holding the mirror")
+    parser.add_argument('--interval', type=float, default=0,
+                        help="refresh every INTERVAL seconds (default: refresh once)")
+    parser.add_argument('--full', action='store_true', help="rebuild the mirror first")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    full = args.full
+    while True:
+        summary = refresh_replica(args.path, batch_size=args.batch_size, full=full)
+        print(f"Copied {summary['rows']} rows in {summary['seconds']:.2f}s "
+              f"(watermark {summary['watermark']})")
+        if not args.interval:
+            break
+        full = False
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
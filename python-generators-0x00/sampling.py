@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+"""
+This module provides the sampling helpers behind the approximate age
+aggregates: reservoir sampling of any stream, random user_id seek keys
+for block sampling, and Student t confidence intervals.
+"""
+
+import math
+import random
+import statistics
+
+from stream_stats import RunningStats
+
+_MISSING = object()
+
+
+def reservoir_sample(iterable, k, seed=None):
+    """
+    Returns a uniform random sample of k items from iterable in one pass
+    and O(k) memory (Algorithm L).
+    """
+    rng = random.Random(seed)
+    iterator = iter(iterable)
+    reservoir = []
+    for item in iterator:
+        reservoir.append(item)
+        if len(reservoir) == k:
+            break
+    if len(reservoir) < k or k == 0:
+        return reservoir
+
+    w = math.exp(math.log(_uniform(rng)) / k)
+    while True:
+        skip = int(math.log(_uniform(rng)) / math.log(1 - w))
+        for _ in range(skip):
+            if next(iterator, _MISSING) is _MISSING:
+                return reservoir
+        item = next(iterator, _MISSING)
+        if item is _MISSING:
+            return reservoir
+        reservoir[rng.randrange(k)] = item
+        w *= math.exp(math.log(_uniform(rng)) / k)
+
+
+def _uniform(rng):
+    """A uniform float in the open interval (0, 1)."""
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+
+def random_user_id_key(rng):
+    """
+    Returns a random seek key in the user_id key space. user_ids are
+    lowercase UUIDs, so keys are spread uniformly over the table.
+    """
+    return format(rng.getrandbits(32), '08x')
+
+
+def z_score(confidence):
+    """Two-sided normal critical value for a confidence level."""
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _t_coverage(t, df):
+    """
+    P(|T| < t) for Student's t with an integer number of degrees of
+    freedom, from the finite series of Abramowitz and Stegun 26.7.3-4.
+    """
+    theta = math.atan(t / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    if df % 2:
+        term = total = math.cos(theta) if df > 1 else 0.0
+        for k in range(3, df, 2):
+            term *= cos2 * (k - 1) / k
+            total += term
+        return 2 / math.pi * (theta + math.sin(theta) * total)
+    term = total = 1.0
+    for k in range(2, df, 2):
+        term *= cos2 * (k - 1) / k
+        total += term
+    return math.sin(theta) * total
+
+
+def t_score(confidence, df):
+    """
+    Two-sided Student t critical value for a confidence level and df
+    degrees of freedom. Past 100 degrees of freedom the Cornish-Fisher
+    expansion around z_score is accurate to well under 1e-4.
+    """
+    if df > 100:
+        z = z_score(confidence)
+        return (z + (z ** 3 + z) / (4 * df)
+                + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+                + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+    low, high = 0.0, 1.0
+    while _t_coverage(high, df) < confidence:
+        low, high = high, high * 2
+    for _ in range(60):
+        middle = (low + high) / 2
+        if _t_coverage(middle, df) < confidence:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+def mean_estimate(stats, confidence=0.95, population=None):
+    """
+    Turns a RunningStats over sampled units into an estimate of the mean
+    with a confidence interval. The interval uses the Student t critical
+    value for count - 1 degrees of freedom, so it stays honest for small
+    samples. population, when known, applies the finite population
+    correction.
+    """
+    if stats.count == 0:
+        return {'estimate': None, 'ci_low': None, 'ci_high': None,
+                'half_width': None, 'confidence': confidence, 'sample_size': 0}
+    standard_error = math.sqrt(stats.sample_variance / stats.count)
+    if population and population > 1:
+        standard_error *= math.sqrt(max(population - stats.count, 0) / (population - 1))
+    half_width = (t_score(confidence, stats.count - 1) * standard_error
+                  if stats.count > 1 else math.inf)
+    return {
+        'estimate': stats.mean,
+        'ci_low': stats.mean - half_width,
+        'ci_high': stats.mean + half_width,
+        'half_width': half_width,
+        'confidence': confidence,
+        'sample_size': stats.count,
+    }
+
+
+def stats_of(values):
+    """Returns a RunningStats over values."""
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    return stats
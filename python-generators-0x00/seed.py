@@ -6,8 +6,16 @@ and inserting data from a CSV file.
 """
 
 import mysql.connector
+import collections
+import contextlib
 import csv
+import hashlib
+import io
+import itertools
+import json
 import os
+import threading
+import time
 
 
 def connect_db():
@@ -35,23 +43,385 @@ def create_database(connection):
         print(f"Error creating database: {err}")
 
 
-def connect_to_prodev():
-    """Connects to the ALX_prodev database in MySQL."""
+def connect_to_prodev(database='ALX_prodev'):
+    """Connects to the ALX_prodev database (or another one) in MySQL."""
     try:
         connection = mysql.connector.connect(
             host='localhost',
             user=os.getenv('DB_USER', 'root'),
             password=os.getenv('DB_PASS', ''),
-            database='ALX_prodev'
+            database=database
         )
         return connection
     except mysql.connector.Error as err:
-        print(f"Error connecting to ALX_prodev: {err}")
+        print(f"Error connecting to {database}: {err}")
         return None
 
 
+class ConnectionPool:
+    """
+    A small thread-safe pool of connections to the ALX_prodev database.
+
+    Up to size connections are pooled. When all of them are checked out,
+    up to max_overflow extra connections are opened and closed again on
+    release; past that, a checkout waits up to timeout seconds and then
+    gives up. Connections idle for longer than max_idle seconds are closed
+    instead of reused, and a connection idle for longer than ping_after
+    seconds is pinged before it is handed out again.
+    """
+
+    def __init__(self, size=5, max_idle=300, ping_after=5, connect=None,
+                 max_overflow=10, timeout=30):
+        self.size = size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._connect = connect or connect_to_prodev
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._overflow = set()
+        self._overflow_slots = 0
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'checked_out': 0,
+            'overflow': 0,
+        }
+
+    def get_connection(self, timeout=None):
+        """
+        Checks a healthy connection out of the pool, opening a new one if
+        none is idle. timeout defaults to the pool's. Returns None if no
+        connection could be obtained.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                # Reserve the overflow slot before connecting, so concurrent
+                # callers cannot all pass the check
+                overflow = self._overflow_slots < self.max_overflow
+                if overflow:
+                    self._overflow_slots += 1
+            if overflow:
+                return self._open_overflow()
+            timeout = self.timeout if timeout is None else timeout
+            if not self._slots.acquire(timeout=timeout):
+                print(f"Error: timed out after {timeout}s waiting for a pooled connection "
+                      f"({self.size} pooled and {self.max_overflow} overflow in use).")
+                return None
+
+        connection = self._take_idle()
+        if connection is None:
+            connection = self._connect()
+            if connection is None:
+                self._slots.release()
+                return None
+            with self._lock:
+                self._stats['created'] += 1
+        with self._lock:
+            self._stats['checked_out'] += 1
+        _owners[id(connection)] = self
+        return connection
+
+    def _open_overflow(self):
+        """
+        Opens a connection beyond size, which is closed on release. The
+        caller has reserved an overflow slot; it is given back on failure.
+        """
+        connection = self._connect()
+        if connection is None:
+            with self._lock:
+                self._overflow_slots -= 1
+            return None
+        with self._lock:
+            self._overflow.add(id(connection))
+            self._stats['created'] += 1
+            self._stats['overflow'] += 1
+            self._stats['checked_out'] += 1
+        _owners[id(connection)] = self
+        return connection
+
+    def _take_idle(self):
+        """Pops the most recently used idle connection that is still usable."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, released_at = self._idle.pop()
+            idle_for = time.monotonic() - released_at
+            if idle_for > self.max_idle:
+                self._close_quietly(connection)
+                with self._lock:
+                    self._stats['recycled'] += 1
+                continue
+            if idle_for > self.ping_after and not connection.is_connected():
+                self._close_quietly(connection)
+                with self._lock:
+                    self._stats['discarded'] += 1
+                continue
+            with self._lock:
+                self._stats['reused'] += 1
+            return connection
+
+    def release_connection(self, connection):
+        """
+        Returns a connection to the pool. Connections that still have
+        unread results or a lost link are closed rather than reused.
+        """
+        if connection is None:
+            return
+        _owners.pop(id(connection), None)
+        with self._lock:
+            overflow = id(connection) in self._overflow
+            if overflow:
+                self._overflow.discard(id(connection))
+                self._overflow_slots -= 1
+        if overflow:
+            with self._lock:
+                self._stats['checked_out'] -= 1
+            self._close_quietly(connection)
+            return
+
+        try:
+            reusable = (not self._closed and not connection.unread_result
+                        and connection.is_connected())
+            if reusable:
+                connection.rollback()
+        except mysql.connector.Error:
+            reusable = False
+
+        with self._lock:
+            self._stats['checked_out'] -= 1
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._stats['discarded'] += 1
+        if not reusable:
+            self._close_quietly(connection)
+        self._slots.release()
+
+    def get_stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['size'] = self.size
+        return stats
+
+    def close(self):
+        """
+        Closes every idle connection held by the pool. Connections still
+        checked out are closed when they are released.
+        """
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+
+_pool = None
+_pool_pid = None
+_pool_options = {}
+_pool_lock = threading.Lock()
+
+# id(connection) -> the ConnectionPool that checked it out
+_owners = {}
+
+
+def configure_pool(**kwargs):
+    """
+    Replaces the shared pool with one built from kwargs (see ConnectionPool).
+    The pool size defaults to the DB_POOL_SIZE environment variable.
+
+    Forked children inherit these options and build their own pool from
+    them. Spawned children (the default on macOS and Windows, and
+    forkserver on Linux from Python 3.14) start with a default pool
+    instead, so code starting workers must pass pool_options() to them
+    and call configure_pool there, as parallel_scan does.
+    """
+    global _pool, _pool_pid, _pool_options
+    kwargs.setdefault('size', int(os.getenv('DB_POOL_SIZE', '5')))
+    with _pool_lock:
+        old = _pool if _pool_pid == os.getpid() else None
+        _pool_options = kwargs
+        _pool = ConnectionPool(**kwargs)
+        _pool_pid = os.getpid()
+    # A pool inherited from the parent shares its sockets: leave it alone
+    if old is not None:
+        old.close()
+    return _pool
+
+
+def pool_options():
+    """
+    Returns the options of the shared pool, to rebuild it in a worker
+    process with configure_pool(**options).
+    """
+    with _pool_lock:
+        return dict(_pool_options)
+
+
+def get_pool():
+    """
+    Returns the shared pool of this process, creating it on first use.
+    A child process never reuses the sockets inherited from its parent.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            options = dict(_pool_options)
+            options.setdefault('size', int(os.getenv('DB_POOL_SIZE', '5')))
+            _pool = ConnectionPool(**options)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_connection(timeout=None):
+    """Checks a connection out of the shared pool."""
+    return get_pool().get_connection(timeout)
+
+
+def release_connection(connection):
+    """
+    Returns a connection to the pool that handed it out, even if the
+    shared pool has been replaced (see configure_pool) since.
+    """
+    if connection is None:
+        return
+    pool = _owners.get(id(connection))
+    if pool is None:
+        pool = get_pool()
+    pool.release_connection(connection)
+
+
+@contextlib.contextmanager
+def pooled_connection(timeout=None):
+    """Context manager that checks a connection out and always returns it."""
+    connection = get_connection(timeout)
+    try:
+        yield connection
+    finally:
+        release_connection(connection)
+
+
+def close_cursor(cursor):
+    """Closes a cursor, ignoring rows left unread by an abandoned stream."""
+    if cursor is None:
+        return
+    try:
+        cursor.close()
+    except mysql.connector.Error:
+        pass
+
+
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+# Maintained by MySQL on every insert/update, see create_table
+TRACKING_COLUMNS = ('updated_at',)
+
+
+class UserRow(collections.namedtuple('UserRow', USER_COLUMNS)):
+    """
+    A compact, tuple-backed user_data row with attribute access.
+
+    It costs a fraction of a dict row and still supports row['age'] style
+    lookups, so code written for dictionary cursors keeps working. Use
+    UserRow._make as the row_factory of the generators.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+
+PREDICATE_OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'IN', 'NOT IN', 'LIKE')
+
+
+def build_select(columns=None, where=None, table='user_data', order_by=None):
+    """
+    Builds a parameterized SELECT on table and returns (query, params).
+
+    columns is an iterable of column names (all user_data columns by
+    default), where a list of conditions accepted by build_where and
+    order_by a column name or list of column names, sorted ascending.
+    """
+    columns = tuple(columns) if columns else USER_COLUMNS
+    for column in columns:
+        _check_column(column)
+
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    clause, params = build_where(where)
+    query += clause
+    if order_by:
+        order_by = (order_by,) if isinstance(order_by, str) else tuple(order_by)
+        for column in order_by:
+            _check_column(column)
+        query += f" ORDER BY {', '.join(order_by)}"
+    return query, params
+
+
+def build_where(where=None):
+    """
+    Builds a parameterized WHERE clause and returns (clause, params).
+
+    where is a list of (column, operator, value) conditions that are ANDed
+    together. Column names and operators are checked against whitelists;
+    values are always sent as parameters. IN / NOT IN expect a non-empty
+    sequence of values. An empty where gives an empty clause.
+    """
+    clauses = []
+    params = []
+    for column, operator, value in where or ():
+        _check_column(column)
+        operator = operator.upper()
+        if operator not in PREDICATE_OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        if operator in ('IN', 'NOT IN'):
+            values = list(value)
+            if not values:
+                raise ValueError(f"{operator} needs at least one value")
+            placeholders = ', '.join(['%s'] * len(values))
+            clauses.append(f"{column} {operator} ({placeholders})")
+            params.extend(values)
+        else:
+            clauses.append(f"{column} {operator} %s")
+            params.append(value)
+
+    if not clauses:
+        return "", ()
+    return " WHERE " + " AND ".join(clauses), tuple(params)
+
+
+def _check_column(column):
+    if column not in USER_COLUMNS and column not in TRACKING_COLUMNS:
+        raise ValueError(f"Unknown user_data column: {column}")
+
+
 def create_table(connection):
-    """Creates a table user_data if it does not exist."""
+    """
+    Creates a table user_data if it does not exist.
+
+    updated_at is set by MySQL whenever a row is inserted or changed and
+    is indexed together with user_id, so changed rows can be read in
+    order (see stream_changes). Tables created before the column existed
+    are upgraded in place.
+    """
     try:
         cursor = connection.cursor()
         cursor.execute("""
@@ -59,17 +429,58 @@ def create_table(connection):
                 user_id VARCHAR(255) PRIMARY KEY,
                 name VARCHAR(255) NOT NULL,
                 email VARCHAR(255) NOT NULL,
-                age DECIMAL NOT NULL
+                age DECIMAL NOT NULL,
+                updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_user_data_updated_at (updated_at, user_id)
             )
         """)
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+              AND COLUMN_NAME = 'updated_at'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("""
+                ALTER TABLE user_data
+                ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                ADD INDEX idx_user_data_updated_at (updated_at, user_id)
+            """)
+            print("Added updated_at change tracking to user_data")
         print("Table user_data created successfully")
         cursor.close()
     except mysql.connector.Error as err:
         print(f"Error creating table: {err}")
 
 
-def insert_data(connection, data_file):
-    """Inserts data in the database if it does not exist."""
+def read_csv_chunks(data_file, chunk_size=1000):
+    """
+    Yields rows of a user_data CSV file in lists of at most chunk_size,
+    skipping the header, so the whole file is never held in memory.
+    """
+    with open(data_file, 'r', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header
+        chunk = []
+        for row in reader:
+            chunk.append((row[0], row[1], row[2], row[3]))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def insert_data(connection, data_file, chunk_size=1000, commit_every=10000):
+    """
+    Inserts data in the database if it does not exist.
+
+    The CSV is streamed in chunks of chunk_size rows and each chunk is sent
+    with executemany, which the connector rewrites into a single multi-row
+    INSERT. A commit is issued every commit_every rows so the load never
+    holds one huge transaction open.
+    """
     try:
         cursor = connection.cursor()
         cursor.execute("SELECT COUNT(*) FROM user_data")
@@ -78,18 +489,237 @@ def insert_data(connection, data_file):
             cursor.close()
             return
 
-        with open(data_file, 'r') as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
-            for row in reader:
-                cursor.execute(
-                    "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
-                    (row[0], row[1], row[2], row[3])
-                )
+        start = time.perf_counter()
+        inserted = 0
+        uncommitted = 0
+        for chunk in read_csv_chunks(data_file, chunk_size):
+            cursor.executemany(
+                "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
+                chunk
+            )
+            inserted += len(chunk)
+            uncommitted += len(chunk)
+            if uncommitted >= commit_every:
+                connection.commit()
+                uncommitted = 0
         connection.commit()
-        print("Data inserted successfully.")
+        elapsed = time.perf_counter() - start
+        rate = inserted / elapsed if elapsed > 0 else 0
+        print(f"Data inserted successfully: {inserted} rows "
+              f"in {elapsed:.2f}s ({rate:.0f} rows/sec).")
         cursor.close()
     except mysql.connector.Error as err:
         print(f"Error inserting data: {err}")
     except FileNotFoundError:
         print(f"Error: {data_file} not found.")
+
+
+def load_checkpoint(path):
+    """Returns the JSON state saved at path, or None if there is none."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    """Atomically replaces the JSON state saved at path."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_line_chunks(data_file, chunk_size=1000, start_offset=None):
+    """
+    Yields (end_offset, raw_bytes) for consecutive chunks of chunk_size
+    lines of a CSV file, skipping the header, or starting at start_offset
+    (the end offset of an earlier chunk). Each record must fit on one
+    line, as in user_data.csv.
+    """
+    with open(data_file, 'rb') as f:
+        if start_offset:
+            f.seek(start_offset)
+            offset = start_offset
+        else:
+            offset = len(f.readline())  # Skip header
+        lines = []
+        for line in f:
+            lines.append(line)
+            offset += len(line)
+            if len(lines) >= chunk_size:
+                yield offset, b''.join(lines)
+                lines = []
+        if lines:
+            yield offset, b''.join(lines)
+
+
+# The row alias form needs MySQL 8.0.19+; VALUES(col) is deprecated since 8.0.20
+UPSERT_QUERY = (
+    "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s) AS new "
+    "ON DUPLICATE KEY UPDATE name = new.name, email = new.email, age = new.age"
+)
+
+
+def _read_chunk_log(path, lines):
+    """
+    Returns the [end_offset, digest, rows] entries recorded in the first
+    lines lines of a chunk log. A later line for the same chunk index
+    replaces the earlier one.
+    """
+    entries = []
+    try:
+        with open(path, 'r') as f:
+            for line in itertools.islice(f, lines):
+                index, end_offset, digest, rows = line.split()
+                entry = [int(end_offset), digest, int(rows)]
+                if int(index) < len(entries):
+                    entries[int(index)] = entry
+                else:
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _log_line(index, entry):
+    end_offset, digest, rows = entry
+    return f"{index} {end_offset} {digest} {rows}\n"
+
+
+def _write_chunk_log(path, entries):
+    """Atomically replaces a chunk log with entries, one line per chunk."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(_log_line(index, entry) for index, entry in enumerate(entries))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _matching_prefix(data_file, known):
+    """
+    Returns how many of the recorded chunks, from the start of data_file,
+    still hash the same. Each chunk is re-hashed straight from its byte
+    range, without splitting or parsing lines.
+    """
+    with open(data_file, 'rb') as f:
+        start = len(f.readline())
+        for index, (end_offset, digest, _) in enumerate(known):
+            raw = f.read(end_offset - start)
+            if len(raw) != end_offset - start or hashlib.sha1(raw).hexdigest() != digest:
+                return index
+            start = end_offset
+    return len(known)
+
+
+def upsert_data(connection, data_file, chunk_size=1000, checkpoint_file=None,
+                checkpoint_every=100):
+    """
+    Loads a CSV file into user_data incrementally and idempotently.
+
+    The file is read in chunks of chunk_size lines and each chunk is
+    upserted with INSERT ... ON DUPLICATE KEY UPDATE and committed. The
+    end offset, hash and row count of every loaded chunk are appended to
+    a chunk log (checkpoint_file + '.chunks'), and every checkpoint_every
+    chunks the log is synced and the offset, row count and number of
+    chunks are saved to checkpoint_file (data_file + '.checkpoint' by
+    default).
+
+    On the next run every chunk whose hash is unchanged is skipped, so
+    editing one row reloads only its chunk. When the recorded chunks are
+    all unchanged (a crashed load, or rows appended to the file), the
+    load seeks straight past them and reads only the new tail. At most
+    checkpoint_every chunks are upserted again after a crash.
+    """
+    checkpoint_file = checkpoint_file or f"{data_file}.checkpoint"
+    log_file = f"{checkpoint_file}.chunks"
+    state = load_checkpoint(checkpoint_file)
+    if not state or state.get('chunk_size') != chunk_size or 'lines' not in state:
+        state = {'chunk_size': chunk_size, 'offset': 0, 'rows': 0, 'chunks': 0, 'lines': 0}
+    # Lines past the last checkpoint may not be synced; their chunks are redone
+    known = _read_chunk_log(log_file, state['lines'])
+
+    def checkpoint(lines):
+        state['lines'] = lines
+        state['chunks'] = len(known)
+        state['offset'] = known[-1][0] if known else 0
+        state['rows'] = sum(entry[2] for entry in known)
+        stat = os.stat(data_file)
+        state['size'], state['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+        save_checkpoint(checkpoint_file, state)
+
+    # Drop unsynced and replaced lines before appending again
+    _write_chunk_log(log_file, known)
+    if state['lines'] != len(known):
+        state['lines'] = len(known)
+        save_checkpoint(checkpoint_file, state)
+
+    try:
+        stat = os.stat(data_file)
+        unchanged = (stat.st_size, stat.st_mtime_ns) == (state.get('size'), state.get('mtime_ns'))
+        if unchanged or _matching_prefix(data_file, known) == len(known):
+            start_index = len(known)
+            start_offset = known[-1][0] if known else None
+        else:
+            # Something changed: read every chunk and compare it with its hash
+            start_index, start_offset = 0, None
+
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        loaded = upserted = 0
+        skipped = chunks = start_index
+        lines = len(known)
+        with open(log_file, 'a') as log:
+            for index, (end_offset, raw) in enumerate(
+                    read_line_chunks(data_file, chunk_size, start_offset), start_index):
+                chunks = index + 1
+                digest = hashlib.sha1(raw).hexdigest()
+                if index < len(known) and known[index][1] == digest:
+                    skipped += 1
+                    if known[index][0] != end_offset:
+                        # An earlier edit changed the length of a line
+                        known[index][0] = end_offset
+                        log.write(_log_line(index, known[index]))
+                        lines += 1
+                    continue
+
+                reader = csv.reader(io.StringIO(raw.decode('utf-8'), newline=''))
+                rows = [(row[0], row[1], row[2], row[3]) for row in reader if row]
+                cursor.executemany(UPSERT_QUERY, rows)
+                connection.commit()
+                loaded += 1
+                upserted += len(rows)
+
+                entry = [end_offset, digest, len(rows)]
+                if index < len(known):
+                    known[index] = entry
+                else:
+                    known.append(entry)
+                log.write(_log_line(index, entry))
+                lines += 1
+                if loaded % checkpoint_every == 0:
+                    log.flush()
+                    os.fsync(log.fileno())
+                    checkpoint(lines)
+            log.flush()
+            os.fsync(log.fileno())
+            checkpoint(lines)
+        if len(known) > chunks:
+            # The file got shorter: forget the chunks past its end
+            del known[chunks:]
+            _write_chunk_log(log_file, known)
+            checkpoint(len(known))
+
+        elapsed = time.perf_counter() - start
+        rate = upserted / elapsed if elapsed > 0 else 0
+        print(f"Upserted {upserted} rows in {loaded} chunks, skipped {skipped} "
+              f"unchanged chunks in {elapsed:.2f}s ({rate:.0f} rows/sec).")
+        cursor.close()
+    except mysql.connector.Error as err:
+        print(f"Error upserting data: {err}")
+    except FileNotFoundError:
+        print(f"Error: {data_file} not found.")
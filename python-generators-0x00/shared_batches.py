@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+"""
+This module hands user_data batches to worker processes through shared
+memory instead of pickling them.
+
+Each batch is written in the columnar layout of columnar.ColumnarBatch
+into one slot of a multiprocessing.shared_memory ring buffer, and only a
+small layout descriptor (slot number and column offsets) is sent to the
+workers. A worker maps the slot as a ColumnarBatch whose columns are
+memoryviews of the shared block, so no row is copied or unpickled, and
+the slot is reused once the worker is done with it.
+"""
+
+import multiprocessing
+import pickle
+import traceback
+from array import array
+from multiprocessing import shared_memory
+from queue import Empty
+
+from columnar import ColumnarBatch, StringColumn
+
+_ERROR = '__error__'
+_ALIGN = 8
+
+# Seconds between checks that the workers are still alive
+POLL_INTERVAL = 1.0
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _as_columnar(batch):
+    """Returns batch as a ColumnarBatch, converting a list of dict rows."""
+    if isinstance(batch, ColumnarBatch):
+        return batch
+    names = list(batch[0]) if batch else []
+    return ColumnarBatch.from_rows(names, [tuple(row.values()) for row in batch])
+
+
+def packed_size(batch):
+    """Bytes a ColumnarBatch takes in a shared slot, padding included."""
+    size = 0
+    for column in batch.columns.values():
+        if isinstance(column, StringColumn):
+            size = _aligned(size + len(column.offsets) * 8) + len(column.data)
+        else:
+            size += len(column) * 8
+        size = _aligned(size)
+    return size
+
+
+def pack_batch(batch, buffer, start=0):
+    """
+    Writes a ColumnarBatch into buffer at start and returns its layout:
+    (rows, [(name, kind, offset, length, data_offset, data_length), ...]).
+    Float columns are stored as float64 values, string columns as their
+    int64 offsets followed by the UTF-8 data.
+    """
+    position = start
+    columns = []
+    for name, column in batch.columns.items():
+        if isinstance(column, StringColumn):
+            offsets = column.offsets
+            if not isinstance(offsets, array) or offsets.typecode != 'q':
+                offsets = array('q', offsets)
+            length = len(offsets) * 8
+            buffer[position:position + length] = memoryview(offsets).cast('B')
+            data_offset = _aligned(position + length)
+            data_length = len(column.data)
+            buffer[data_offset:data_offset + data_length] = column.data
+            columns.append((name, 's', position, length, data_offset, data_length))
+            position = _aligned(data_offset + data_length)
+        else:
+            values = column if isinstance(column, array) else array('d', column)
+            length = len(values) * 8
+            buffer[position:position + length] = memoryview(values).cast('B')
+            columns.append((name, 'd', position, length, None, None))
+            position = _aligned(position + length)
+    return len(batch), columns
+
+
+def unpack_batch(buffer, layout):
+    """
+    Maps a packed batch back to a ColumnarBatch without copying: every
+    column is a memoryview of buffer. The views are only valid until the
+    slot is reused, so copy anything that must outlive the call.
+    """
+    view = memoryview(buffer)
+    _, columns = layout
+    batch = {}
+    for name, kind, offset, length, data_offset, data_length in columns:
+        if kind == 's':
+            batch[name] = StringColumn(view[data_offset:data_offset + data_length],
+                                       view[offset:offset + length].cast('q'))
+        else:
+            batch[name] = view[offset:offset + length].cast('d')
+    return ColumnarBatch(batch)
+
+
+class SharedBatchRing:
+    """
+    A ring of fixed-size slots in one shared memory block. The creating
+    process owns the block and must call close() (or use the ring as a
+    context manager) to free it.
+    """
+
+    def __init__(self, slots=8, slot_bytes=4 << 20):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.memory = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.free = list(range(slots))
+
+    def write(self, slot, batch):
+        """Packs a ColumnarBatch into slot and returns its layout."""
+        size = packed_size(batch)
+        if size > self.slot_bytes:
+            raise ValueError(f"batch of {size} bytes does not fit a {self.slot_bytes}-byte "
+                             "slot; raise slot_bytes or lower the batch size")
+        start = slot * self.slot_bytes
+        view = self.memory.buf[start:start + self.slot_bytes]
+        try:
+            return pack_batch(batch, view)
+        finally:
+            view.release()
+
+    def read(self, slot, layout):
+        """Maps the batch held in slot (see unpack_batch)."""
+        start = slot * self.slot_bytes
+        return unpack_batch(self.memory.buf[start:start + self.slot_bytes], layout)
+
+    def close(self):
+        """Releases and unlinks the shared block."""
+        try:
+            self.memory.close()
+        except BufferError:
+            # A caller still holds a view; the mapping goes with the process
+            pass
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _shared_worker(func, ring, tasks, results):
+    """Worker: applies func to each batch slot it is handed."""
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, slot, layout = task
+        try:
+            # Pickle here, not in the queue's feeder thread, so that an
+            # unpicklable result (e.g. a column view of the slot) is
+            # reported instead of silently lost
+            payload = pickle.dumps(func(ring.read(slot, layout)))
+        except Exception:
+            payload = pickle.dumps((_ERROR, traceback.format_exc()))
+        results.put((seq, slot, payload))
+
+
+def map_shared_batches(func, batches=None, workers=4, slots=None, slot_bytes=4 << 20,
+                       batch_size=1000, **stream_options):
+    """
+    Applies func to every batch in worker processes and yields
+    (batch_number, result) pairs in completion order.
+
+    batches defaults to stream_users_in_batches(batch_size, columnar=True,
+    **stream_options); lists of dict rows are converted to columnar
+    batches first. Each batch is written into a free slot of a shared
+    ring of slots (2 * workers by default) and func receives it as a
+    zero-copy ColumnarBatch. func must be a picklable module-level
+    function and must not keep the batch after returning, since its slot
+    is then refilled; only its result is pickled back, so return copies
+    (e.g. list(batch['age'])), not the column views themselves. A result
+    that cannot be pickled, or a worker that dies, raises RuntimeError. The producer waits
+    for a free slot when all are in use, so at most slots batches are in
+    flight.
+    """
+    owned = batches is None
+    if owned:
+        stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+        batches = stream_users_in_batches(batch_size, columnar=True, **stream_options)
+    ring = SharedBatchRing(slots or 2 * workers, slot_bytes)
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    processes = []
+    try:
+        for _ in range(workers):
+            process = multiprocessing.Process(target=_shared_worker,
+                                              args=(func, ring, tasks, results))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+
+        def collect():
+            while True:
+                try:
+                    seq, slot, payload = results.get(timeout=POLL_INTERVAL)
+                    break
+                except Empty:
+                    dead = [process for process in processes if not process.is_alive()]
+                    if dead:
+                        raise RuntimeError(
+                            f"Shared batch worker exited with code {dead[0].exitcode} "
+                            "before finishing") from None
+            result = pickle.loads(payload)
+            ring.free.append(slot)
+            if isinstance(result, tuple) and len(result) == 2 and result[0] == _ERROR:
+                raise RuntimeError(f"Shared batch worker failed:\n{result[1]}")
+            return seq, result
+
+        in_flight = 0
+        for seq, batch in enumerate(batches):
+            while not ring.free:
+                yield collect()
+                in_flight -= 1
+            slot = ring.free.pop()
+            tasks.put((seq, slot, ring.write(slot, _as_columnar(batch))))
+            in_flight += 1
+        while in_flight:
+            yield collect()
+            in_flight -= 1
+        for _ in processes:
+            tasks.put(None)
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        ring.close()
+        if owned:
+            batches.close()
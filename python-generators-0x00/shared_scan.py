@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+"""
+This module provides a shared scan: user_data is read once and every
+batch is fanned out to several registered consumers.
+
+Each consumer is a function that takes an iterable of batches and
+returns a result, the same shape as a job written against
+stream_users_in_batches. Consumers run in their own threads behind
+bounded queues, so a slow consumer applies back-pressure to the scan
+instead of letting batches pile up, and a consumer that fails is
+detached without stopping the others.
+"""
+
+import queue
+import threading
+
+_END = object()
+
+
+class _SourceFailed:
+    """Marker sent to consumers when the shared source raised."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class _Consumer:
+    """A registered consumer: its function, queue, thread and outcome."""
+
+    def __init__(self, name, func, queue_depth):
+        self.name = name
+        self.func = func
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"consumer-{name}",
+                                       daemon=True)
+
+    def _batches(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _END:
+                return
+            if isinstance(batch, _SourceFailed):
+                raise RuntimeError("shared scan source failed") from batch.error
+            yield batch
+
+    def _run(self):
+        try:
+            self.result = self.func(self._batches())
+        except Exception as err:
+            self.error = err
+        finally:
+            self.done.set()
+
+    def offer(self, item):
+        """
+        Blocks until the consumer accepts item. Returns False once the
+        consumer has finished or failed, so it is no longer fed.
+        """
+        while not self.done.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+
+class SharedScan:
+    """
+    Reads batches from one source and feeds each of them to every
+    registered consumer.
+
+    Batches are shared between consumers and must not be modified.
+    """
+
+    def __init__(self, batches, queue_depth=4):
+        self.batches = batches
+        self.queue_depth = queue_depth
+        self._consumers = {}
+        self.errors = {}
+
+    def register(self, name, func):
+        """Registers func(batches) under name; returns self for chaining."""
+        if name in self._consumers:
+            raise ValueError(f"Consumer already registered: {name}")
+        self._consumers[name] = _Consumer(name, func, self.queue_depth)
+        return self
+
+    def run(self):
+        """
+        Runs the scan and returns {name: result} for the consumers that
+        succeeded. Failures are printed and kept in self.errors. An error
+        raised by the source itself is re-raised once all consumers stop.
+        """
+        consumers = list(self._consumers.values())
+        for consumer in consumers:
+            consumer.thread.start()
+
+        source_error = None
+        live = list(consumers)
+        try:
+            for batch in self.batches:
+                live = [consumer for consumer in live if consumer.offer(batch)]
+                if not live:
+                    break
+        except Exception as err:
+            source_error = err
+        finally:
+            close = getattr(self.batches, 'close', None)
+            if close is not None:
+                close()
+            marker = _END if source_error is None else _SourceFailed(source_error)
+            for consumer in live:
+                consumer.offer(marker)
+            for consumer in consumers:
+                consumer.thread.join()
+
+        results = {}
+        for consumer in consumers:
+            if consumer.error is not None:
+                self.errors[consumer.name] = consumer.error
+                print(f"Error in consumer {consumer.name}: {consumer.error}")
+            else:
+                results[consumer.name] = consumer.result
+        if source_error is not None:
+            raise source_error
+        return results
+
+
+def shared_scan(consumers, batch_size=1000, queue_depth=4, **stream_options):
+    """
+    Scans user_data once with stream_users_in_batches(batch_size,
+    **stream_options) and runs every consumer in the {name: func} mapping
+    over the same batches. Returns {name: result}.
+    """
+    stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+    scan = SharedScan(stream_users_in_batches(batch_size, **stream_options), queue_depth)
+    for name, func in consumers.items():
+        scan.register(name, func)
+    return scan.run()
+
+
+if __name__ == "__main__":
+    batch_processing = __import__('1-batch_processing')
+    stream_ages = __import__('4-stream_ages')
+    print(shared_scan({
+        'users_over_25': batch_processing.print_users_over,
+        'average_age': stream_ages.average_age_of,
+    }))
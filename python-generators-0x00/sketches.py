@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+"""
+This module provides fixed-memory streaming operators for user_data
+rows: dedupe() drops rows whose key was already seen using a Bloom
+filter, and count_distinct() estimates the number of distinct keys with
+HyperLogLog. Both work on the rows of any generator in this project;
+for batch generators pass itertools.chain.from_iterable(batches).
+"""
+
+import hashlib
+import math
+
+
+def _key_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+def key_getter(key):
+    """
+    Returns a function extracting key from a row: key may be a callable,
+    a column name (dict rows and seed.UserRow) or a tuple index.
+    """
+    if callable(key):
+        return key
+    return lambda row: row[key]
+
+
+class BloomFilter:
+    """
+    A Bloom filter sized for capacity items at the given false-positive
+    rate. Memory is fixed at creation: about 1.8 bytes per item at 0.1%.
+    Adding more than capacity items raises the false-positive rate.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(_key_bytes(item), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """Adds item; returns True if it was (probably) not present before."""
+        added = False
+        bits = self.bits
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+    @property
+    def nbytes(self):
+        """Size of the bit array in bytes."""
+        return len(self.bits)
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog distinct counter with 2 ** precision registers. The
+    standard error is about 1.04 / sqrt(2 ** precision): 0.8% with the
+    default precision of 14, in 16 KiB.
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    def add(self, item):
+        """Adds one item to the counter."""
+        digest = hashlib.blake2b(_key_bytes(item), digest_size=8).digest()
+        value = int.from_bytes(digest, 'big')
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Folds another counter with the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Returns the estimated number of distinct items added."""
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(estimate))
+
+
+def dedupe(rows, key='email', capacity=10000000, error_rate=0.001):
+    """
+    Yields each row whose key has not been seen before, in fixed memory.
+
+    A false positive drops a row whose key is in fact new, so about
+    error_rate of the unique rows can be lost; duplicates never get
+    through. Size capacity for the number of distinct keys expected.
+    """
+    get_key = key_getter(key)
+    seen = BloomFilter(capacity, error_rate)
+    for row in rows:
+        if seen.add(get_key(row)):
+            yield row
+
+
+def count_distinct(rows, key='email', precision=14):
+    """Estimates the number of distinct keys in rows with HyperLogLog."""
+    get_key = key_getter(key)
+    counter = HyperLogLog(precision)
+    for row in rows:
+        counter.add(get_key(row))
+    return counter.count()
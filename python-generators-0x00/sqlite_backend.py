@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+"""
+This module provides an embedded SQLite stand-in for the ALX_prodev
+MySQL database. Its connections implement the part of the
+mysql-connector API used by the generators (cursor(dictionary=...),
+%s placeholders, fetchmany, is_connected, ...), so they can be handed
+to seed.configure_pool(connect=...) without changing any generator.
+
+Errors are raised as mysql.connector.Error, as the real connector does.
+"""
+
+import functools
+import random
+import sqlite3
+import zlib
+
+import mysql.connector
+
+
+def _translate_errors(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except sqlite3.Error as err:
+            raise mysql.connector.DatabaseError(msg=str(err)) from err
+    return wrapper
+
+
+class _VarPop:
+    """Aggregate implementing MySQL's VAR_POP for SQLite."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+
+    def step(self, value):
+        if value is not None:
+            self.count += 1
+            self.total += value
+            self.squares += value * value
+
+    def finalize(self):
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        return max(self.squares / self.count - mean * mean, 0.0)
+
+
+class SQLiteCursor:
+    """A cursor that accepts %s placeholders and can return dict rows."""
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @_translate_errors
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace('%s', '?'), tuple(params))
+
+    @_translate_errors
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(query.replace('%s', '?'), seq_params)
+
+    def _convert(self, rows):
+        if not self._dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, row)) for row in rows]
+
+    @_translate_errors
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else self._convert([row])[0]
+
+    @_translate_errors
+    def fetchmany(self, size=1):
+        return self._convert(self._cursor.fetchmany(size))
+
+    @_translate_errors
+    def fetchall(self):
+        return self._convert(self._cursor.fetchall())
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """A SQLite connection with the mysql-connector methods the repo uses."""
+
+    unread_result = False
+
+    def __init__(self, path):
+        # Pooled connections move between threads (see prefetch.read_ahead)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.create_function('CRC32', 1, _crc32, deterministic=True)
+        self._connection.create_function('MOD', 2, _mod, deterministic=True)
+        self._connection.create_function('RAND', 0, _rand)
+        self._connection.create_aggregate('VAR_POP', 1, _VarPop)
+        self._open = True
+
+    def cursor(self, dictionary=False, buffered=None, prepared=False, **kwargs):
+        """Returns a cursor; buffered and prepared are accepted and ignored."""
+        return SQLiteCursor(self._connection, dictionary)
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self._open:
+            raise mysql.connector.InterfaceError(msg="Connection is closed")
+
+    @_translate_errors
+    def commit(self):
+        self._connection.commit()
+
+    @_translate_errors
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        if self._open:
+            self._connection.close()
+            self._open = False
+
+
+def _crc32(value):
+    return None if value is None else zlib.crc32(str(value).encode('utf-8'))
+
+
+def _mod(value, divisor):
+    return None if value is None or divisor is None else value % divisor
+
+
+def _rand():
+    # Same contract as MySQL's RAND(): a float in [0, 1)
+    return random.random()
+
+
+def connect(path):
+    """Opens the SQLite stand-in database at path."""
+    return SQLiteConnection(path)
+
+
+TIMESTAMP_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def create_table(connection):
+    """
+    Creates the user_data table in a SQLite stand-in database, with an
+    updated_at column kept current by a trigger as MySQL's ON UPDATE does.
+    """
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id VARCHAR(255) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age DECIMAL NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT ({TIMESTAMP_NOW})
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_data_updated_at
+        ON user_data (updated_at, user_id)
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS user_data_touch
+        AFTER UPDATE OF name, email, age ON user_data
+        BEGIN
+            UPDATE user_data SET updated_at = {TIMESTAMP_NOW}
+            WHERE user_id = NEW.user_id;
+        END
+    """)
+    cursor.close()
+    connection.commit()
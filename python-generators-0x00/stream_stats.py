@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+"""
+This module provides one-pass, constant-memory statistics for streams of
+numbers: count, mean, variance and min/max with Welford's algorithm, and
+approximate percentiles with a KLL-style quantile sketch.
+"""
+
+import math
+import random
+
+
+class RunningStats:
+    """
+    Accumulates count, mean, variance, min and max of a stream of numbers
+    in a single pass using Welford's algorithm.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Adds one value to the statistics."""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Folds the statistics of another RunningStats into this one."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance of the values seen so far."""
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def sample_variance(self):
+        """Unbiased sample variance of the values seen so far."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        """Population standard deviation of the values seen so far."""
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    A KLL-style sketch that estimates quantiles of a stream in O(k) memory.
+
+    Values are buffered in a stack of compactors. When a compactor fills
+    up it is sorted and every other value is promoted to the next level
+    with twice the weight. Larger k gives more accurate estimates; with the
+    default of 200 the rank error is typically well under 1%.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self._levels = [[]]
+        self._rng = random.Random(seed)
+
+    def add(self, value):
+        """Adds one value to the sketch."""
+        self._levels[0].append(value)
+        self.count += 1
+        if len(self._levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        """Folds another sketch into this one."""
+        while len(self._levels) < len(other._levels):
+            self._levels.append([])
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append([])
+                items.sort()
+                keep = [items.pop()] if len(items) % 2 else []
+                offset = self._rng.randint(0, 1)
+                self._levels[level + 1].extend(items[offset::2])
+                self._levels[level] = keep
+            level += 1
+
+    def quantile(self, q):
+        """Returns an estimate of the q-quantile (0 <= q <= 1)."""
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self._levels)
+            for value in items
+        )
+        if not weighted:
+            return None
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target:
+                return value
+        return weighted[-1][0]
+
+    def percentile(self, p):
+        """Returns an estimate of the p-th percentile (0 <= p <= 100)."""
+        return self.quantile(p / 100)
+
+
+def summarize(values, percentiles=(50, 95), k=200):
+    """
+    Consumes an iterable of numbers once and returns a dict with count,
+    mean, variance, stdev, min, max and the requested percentiles.
+    """
+    stats = RunningStats()
+    sketch = QuantileSketch(k)
+    for value in values:
+        value = float(value)
+        stats.add(value)
+        sketch.add(value)
+    return summary_of(stats, sketch, percentiles)
+
+
+def summary_of(stats, sketch, percentiles=(50, 95)):
+    """Builds the summarize() dict from a RunningStats and a QuantileSketch."""
+    summary = {
+        'count': stats.count,
+        'mean': stats.mean if stats.count else None,
+        'variance': stats.variance,
+        'stdev': stats.stdev,
+        'min': stats.min,
+        'max': stats.max,
+    }
+    for p in percentiles:
+        summary[f'p{p:g}'] = sketch.percentile(p)
+    return summary
@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+"""
+This script generates synthetic user_data rows for scale testing.
+
+Rows are deterministic: row i depends only on the seed and on the chunk
+it falls in, never on the number of worker processes, so the same seed
+and count always produce the same table. Ages are right-skewed around
+the early thirties, a share of the rows reuse the email of an earlier
+row, and a share have long multi-part names close to the column limit.
+
+Chunks are produced by a pool of processes and either written to a CSV
+file that seed.insert_data / seed.upsert_data can load, or inserted
+directly, each worker on its own connection.
+
+Usage: ./synth_data.py COUNT (--csv FILE | --sqlite FILE | --mysql)
+                       [--seed N] [--workers N] [--chunk-rows N]
+                       [--duplicate-rate R] [--long-name-rate R]
+"""
+
+import argparse
+import csv
+import functools
+import io
+import multiprocessing
+import os
+import random
+import time
+import uuid
+
+import seed
+import sqlite_backend
+
+FIRST_NAMES = (
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael',
+    'Linda', 'David', 'Elizabeth', 'Amina', 'Kwame', 'Chidi', 'Fatima',
+    'Wanjiru', 'Tunde', 'Zanele', 'Yusuf', 'Ngozi', 'Kofi', 'Mei', 'Hiroshi',
+    'Priya', 'Arjun', 'Sofia', 'Mateo', 'Olga', 'Ivan', 'Chloé', 'José',
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Okafor', 'Mensah',
+    'Kamau', 'Adeyemi', 'Diallo', 'Nkosi', 'Abebe', 'Mwangi', 'Banda',
+    'Tanaka', 'Wang', 'Patel', 'Singh', 'García', 'Rossi', 'Müller',
+    'Kowalski', 'Ivanova', 'Hassan', 'Haddad', 'Cohen', 'Nguyen', 'Kim',
+)
+DOMAINS = ('example.com', 'mail.example.org', 'users.example.net', 'alx.example.io')
+
+MAX_NAME_LENGTH = 255
+MIN_AGE, MAX_AGE = 18, 100
+
+INSERT_QUERY = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
+
+
+def _name_parts(index):
+    """Spreads indexes over first/last name pairs; a pure function of index."""
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES) + index) % len(LAST_NAMES)]
+    return first, last
+
+
+def email_for(index):
+    """The email generated for row index (before duplicates are applied)."""
+    first, last = _name_parts(index)
+    domain = DOMAINS[index % len(DOMAINS)]
+    return f"{first}.{last}.{index}@{domain}".lower()
+
+
+def _age(rng):
+    """A right-skewed age: gamma-distributed years above MIN_AGE."""
+    return min(MIN_AGE + int(rng.gammavariate(2.0, 8.0)), MAX_AGE)
+
+
+def _long_name(rng, first, last):
+    parts = [first]
+    while sum(len(part) + 1 for part in parts) < MAX_NAME_LENGTH - 40:
+        parts.append(rng.choice(FIRST_NAMES + LAST_NAMES))
+    parts.append(last)
+    return ' '.join(parts)[:MAX_NAME_LENGTH]
+
+
+def generate_chunk(chunk, chunk_rows=100000, count=None, seed_value=42,
+                   duplicate_rate=0.02, long_name_rate=0.01):
+    """
+    Returns the rows of chunk number chunk as (user_id, name, email, age)
+    tuples: rows chunk * chunk_rows up to the next chunk or count.
+    """
+    start = chunk * chunk_rows
+    end = start + chunk_rows if count is None else min(start + chunk_rows, count)
+    rng = random.Random(f"{seed_value}:{chunk}")
+    rows = []
+    for index in range(start, end):
+        first, last = _name_parts(index)
+        if rng.random() < long_name_rate:
+            name = _long_name(rng, first, last)
+        else:
+            name = f"{first} {last}"
+        if index and rng.random() < duplicate_rate:
+            email = email_for(rng.randrange(index))
+        else:
+            email = email_for(index)
+        rows.append((
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            name,
+            email,
+            _age(rng),
+        ))
+    return rows
+
+
+def _chunk_count(count, chunk_rows):
+    return (count + chunk_rows - 1) // chunk_rows
+
+
+def generate_rows(count, seed_value=42, chunk_rows=100000, workers=None, **options):
+    """
+    Yields count synthetic rows in lists of at most chunk_rows, in row
+    order. Chunks are generated by workers processes (all CPUs by
+    default); options are passed to generate_chunk.
+    """
+    make = functools.partial(generate_chunk, chunk_rows=chunk_rows, count=count,
+                             seed_value=seed_value, **options)
+    chunks = range(_chunk_count(count, chunk_rows))
+    if workers == 1:
+        yield from map(make, chunks)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(make, chunks)
+
+
+def _csv_chunk(chunk, **options):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(generate_chunk(chunk, **options))
+    return buffer.getvalue()
+
+
+def write_csv(path, count, seed_value=42, chunk_rows=100000, workers=None, **options):
+    """
+    Writes count synthetic rows to a user_data CSV file at path. Workers
+    render whole chunks to CSV text, so the parent only writes strings.
+    """
+    render = functools.partial(_csv_chunk, chunk_rows=chunk_rows, count=count,
+                               seed_value=seed_value, **options)
+    chunks = range(_chunk_count(count, chunk_rows))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write("user_id,name,email,age\r\n")
+        if workers == 1:
+            f.writelines(map(render, chunks))
+        else:
+            with multiprocessing.Pool(workers) as pool:
+                f.writelines(pool.imap(render, chunks))
+    return count
+
+
+_worker_connection = None
+
+
+def _open_worker_connection(connect):
+    global _worker_connection
+    _worker_connection = connect()
+    if not _worker_connection:
+        raise RuntimeError("could not connect to the database")
+
+
+def _insert_chunk(chunk, insert_rows=1000, **options):
+    """Worker: generates one chunk and inserts it on the worker's connection."""
+    rows = generate_chunk(chunk, **options)
+    cursor = _worker_connection.cursor()
+    try:
+        for i in range(0, len(rows), insert_rows):
+            cursor.executemany(INSERT_QUERY, rows[i:i + insert_rows])
+        _worker_connection.commit()
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def bulk_insert(connect, count, seed_value=42, chunk_rows=100000, workers=None,
+                insert_rows=1000, **options):
+    """
+    Generates count rows and inserts them into user_data, each worker on
+    its own connection opened with connect (a picklable callable). Every
+    chunk is committed on its own, in multi-row INSERTs of insert_rows.
+    SQLite allows one writer at a time, so use workers=1 there.
+    """
+    insert = functools.partial(_insert_chunk, insert_rows=insert_rows, chunk_rows=chunk_rows,
+                               count=count, seed_value=seed_value, **options)
+    chunks = range(_chunk_count(count, chunk_rows))
+    with multiprocessing.Pool(workers, _open_worker_connection, (connect,)) as pool:
+        return sum(pool.imap_unordered(insert, chunks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('count', type=int)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--csv', metavar='FILE', help="write a user_data CSV file")
+    target.add_argument('--sqlite', metavar='FILE', help="insert into a SQLite stand-in")
+    target.add_argument('--mysql', action='store_true', help="insert into ALX_prodev")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--long-name-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    options = {
+        'seed_value': args.seed,
+        'chunk_rows': args.chunk_rows,
+        'workers': args.workers,
+        'duplicate_rate': args.duplicate_rate,
+        'long_name_rate': args.long_name_rate,
+    }
+    start = time.perf_counter()
+    if args.csv:
+        rows = write_csv(args.csv, args.count, **options)
+    else:
+        if args.sqlite:
+            connect = functools.partial(sqlite_backend.connect, args.sqlite)
+            create_table = sqlite_backend.create_table
+            options['workers'] = 1
+        else:
+            connect = seed.connect_to_prodev
+            create_table = seed.create_table
+        connection = connect()
+        if not connection:
+            raise SystemExit(1)
+        create_table(connection)
+        connection.close()
+        rows = bulk_insert(connect, args.count, **options)
+    elapsed = time.perf_counter() - start
+    print(f"Generated {rows} rows in {elapsed:.2f}s "
+          f"({rows / elapsed * 60 if elapsed else 0:.0f} rows/min, "
+          f"{options['workers'] or os.cpu_count()} workers).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Unit tests for export.py
+"""
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from parameterized import parameterized
+import export
+import parallel_scan
+from export import (BackgroundWriter, export_batches, export_users, format_of,
+                    part_path, read_columnar)
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+ROWS = [(f"id{i:03d}", f"Zoë {i}", f"user{i}@example.com", 18 + i % 60) for i in range(250)]
+
+
+def read_back(path):
+    """Reads an export back as a list of (user_id, name, email, age) tuples."""
+    kind, compress = format_of(path)
+    if kind == 'ucol':
+        return [tuple(row.values()) for batch in read_columnar(path)
+                for row in batch.to_dicts()]
+    opener = gzip.open if compress else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        if kind == 'csv':
+            reader = csv.reader(f)
+            next(reader)
+            return [(user_id, name, email, float(age)) for user_id, name, email, age in reader]
+        return [tuple(json.loads(line).values()) for line in f]
+
+
+def fail_on_rows(rows, header=None):
+    """Stands in for export._csv_bytes and fails once rows are encoded."""
+    if rows:
+        raise OSError('disk full')
+    return b'user_id,name,email,age\r\n'
+
+
+def exit_on_rows(rows, header=None):
+    """Stands in for export._csv_bytes and kills the worker mid-export."""
+    if rows:
+        os._exit(3)
+    return b'user_id,name,email,age\r\n'
+
+
+class TestExportBatches(unittest.TestCase):
+    """
+    Test case for export.export_batches and export.read_columnar
+    """
+    def setUp(self):
+        """Creates a directory for the exported files."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Removes the exported files."""
+        self.tmpdir.cleanup()
+
+    @parameterized.expand([
+        ('users.csv',),
+        ('users.csv.gz',),
+        ('users.ndjson',),
+        ('users.jsonl.gz',),
+        ('users.ucol',),
+    ])
+    def test_round_trip(self, name):
+        """Test that every format reads back the rows that were exported."""
+        path = os.path.join(self.tmpdir.name, name)
+        batches = [ROWS[i:i + 100] for i in range(0, len(ROWS), 100)]
+        self.assertEqual(export_batches(batches, path), len(ROWS))
+        self.assertEqual(read_back(path),
+                         [(user_id, name, email, float(age))
+                          for user_id, name, email, age in ROWS])
+
+    def test_columns(self):
+        """Test that CSV exports take their header from columns."""
+        path = os.path.join(self.tmpdir.name, 'ages.csv')
+        export_batches([[('a', 30), ('b', 41)]], path, columns=('user_id', 'age'))
+        with open(path, newline='') as f:
+            self.assertEqual(list(csv.reader(f)), [['user_id', 'age'], ['a', '30'], ['b', '41']])
+
+    def test_not_ucol(self):
+        """Test that read_columnar rejects other files."""
+        path = os.path.join(self.tmpdir.name, 'users.csv')
+        export_batches([ROWS], path)
+        with self.assertRaises(ValueError):
+            list(read_columnar(path))
+
+    def test_writer_error(self):
+        """Test that an error on the writer thread is raised to the caller."""
+        writer = BackgroundWriter(os.path.join(self.tmpdir.name, 'out.csv'))
+        writer.write('not bytes')
+        with self.assertRaises(TypeError):
+            writer.close()
+
+    @parameterized.expand([
+        ('users.txt',),
+        ('users',),
+    ])
+    def test_unknown_format(self, name):
+        """Test that unknown suffixes are rejected."""
+        with self.assertRaises(ValueError):
+            format_of(name)
+
+    @parameterized.expand([
+        ('out/users.csv.gz', 3, 'out/users-part-00003.csv.gz'),
+        ('users.ucol', 12, 'users-part-00012.ucol'),
+    ])
+    def test_part_path(self, path, part, expected):
+        """Test that the part number goes before the whole suffix."""
+        self.assertEqual(part_path(path, part), expected)
+
+
+class TestExportUsers(unittest.TestCase):
+    """
+    Integration test: export.export_users, backed by the SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+        cls.expected = sorted((user_id, name, email, float(age))
+                              for user_id, name, email, age in USERS)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def setUp(self):
+        """Creates a directory for the exported files."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'users.csv.gz')
+
+    def tearDown(self):
+        """Removes the exported files."""
+        self.tmpdir.cleanup()
+
+    @parameterized.expand([
+        (1,),
+        (3,),
+    ])
+    def test_export_users(self, workers):
+        """Test that a single file or the part files hold every user once."""
+        summary = export_users(self.path, batch_size=64, workers=workers)
+        self.assertEqual(summary['rows'], len(USERS))
+        self.assertEqual(len(summary['files']), workers)
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)),
+                         sorted(os.path.basename(path) for path in summary['files']))
+        rows = [row for path in summary['files'] for row in read_back(path)]
+        self.assertEqual(sorted(rows), self.expected)
+
+    # The workers are forked so that they inherit the patched _csv_bytes
+    @patch.object(parallel_scan, 'multiprocessing', multiprocessing.get_context('fork'))
+    def test_failed_partition_cleaned_up(self):
+        """Test that a failing partition leaves no temporary or part files."""
+        with patch.object(export, '_csv_bytes', fail_on_rows):
+            with self.assertRaises(RuntimeError) as cm:
+                export_users(self.path, batch_size=64, workers=3)
+        self.assertIn('disk full', str(cm.exception))
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    @patch.object(parallel_scan, 'multiprocessing', multiprocessing.get_context('fork'))
+    def test_dead_worker_cleaned_up(self):
+        """Test that a worker killed mid-export leaves no temporary files."""
+        with patch.object(export, '_csv_bytes', exit_on_rows), \
+                patch.object(parallel_scan, 'POLL_INTERVAL', 0.1):
+            with self.assertRaises(RuntimeError) as cm:
+                export_users(self.path, batch_size=64, workers=3)
+        self.assertIn('exited with code 3', str(cm.exception))
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
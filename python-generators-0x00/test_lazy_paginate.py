@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Unit tests for 2-lazy_paginate.py
+"""
+import itertools
+import unittest
+from parameterized import parameterized
+import seed
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+lazy_paginate = __import__('2-lazy_paginate')
+lazy_pagination = lazy_paginate.lazy_pagination
+paginate_users_after = lazy_paginate.paginate_users_after
+
+
+class TestResumeTokens(unittest.TestCase):
+    """
+    Test case for the keyset resume tokens
+    """
+    @parameterized.expand([
+        ('0b6d1c4e-8f7a-4c2b-9e1d-3a5f7c9b2d4e',),
+        ('Zoë/Ñúñez+?',),
+        ('',),
+    ])
+    def test_round_trip(self, user_id):
+        """Test that a token decodes back to its user_id and is URL safe."""
+        token = lazy_paginate.encode_resume_token(user_id)
+        self.assertEqual(lazy_paginate.decode_resume_token(token), user_id)
+        self.assertNotRegex(token, r'[+/]')
+
+    @parameterized.expand([
+        ('dict', {'user_id': 'abc', 'name': 'Ann'}),
+        ('user_row', seed.UserRow('abc', 'Ann', 'ann@example.com', 30)),
+    ])
+    def test_resume_token_for(self, _, row):
+        """Test that the token resumes after the last row of a page."""
+        token = lazy_paginate.resume_token_for([{'user_id': 'aaa'}, row])
+        self.assertEqual(lazy_paginate.decode_resume_token(token), 'abc')
+
+
+class TestPagination(unittest.TestCase):
+    """
+    Integration test: offset and keyset pagination, backed by the SQLite
+    stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+        cls.user_ids = sorted(user_id for user_id, _, _, _ in USERS)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def assert_released(self):
+        """Checks that no pooled connection is left checked out."""
+        self.assertEqual(seed.get_pool().get_stats()['checked_out'], 0)
+
+    @parameterized.expand([
+        ('keyset', True, 0),
+        ('keyset_prefetch', True, 2),
+        ('offset', False, 0),
+    ])
+    def test_pages(self, _, keyset, prefetch):
+        """Test that the pages hold every user once, in full pages."""
+        pages = list(lazy_pagination(64, keyset=keyset, prefetch=prefetch))
+        self.assertEqual([len(page) for page in pages[:-1]], [64] * (len(pages) - 1))
+        user_ids = [row['user_id'] for page in pages for row in page]
+        if keyset:
+            self.assertEqual(user_ids, self.user_ids)
+        else:
+            self.assertEqual(sorted(user_ids), self.user_ids)
+        self.assert_released()
+
+    @parameterized.expand([
+        ('user_row', seed.UserRow._make, seed.UserRow, lambda row: row.user_id),
+        ('tuple', tuple, tuple, lambda row: row[0]),
+    ])
+    def test_keyset_row_factory(self, _, row_factory, row_type, user_id):
+        """Test that keyset pages keep their order with a row factory."""
+        pages = lazy_pagination(100, keyset=True, row_factory=row_factory)
+        rows = [row for page in pages for row in page]
+        self.assertIsInstance(rows[0], row_type)
+        self.assertEqual([user_id(row) for row in rows], self.user_ids)
+
+    @parameterized.expand([
+        (1,),
+        (3,),
+    ])
+    def test_resume(self, pages_read):
+        """Test that a resume token continues a walk where it stopped."""
+        walk = lazy_pagination(50, keyset=True)
+        first = list(itertools.islice(walk, pages_read))
+        walk.close()
+        self.assert_released()
+        token = lazy_paginate.resume_token_for(first[-1])
+        rest = list(lazy_pagination(50, keyset=True, resume_token=token))
+        user_ids = [row['user_id'] for page in first + rest for row in page]
+        self.assertEqual(user_ids, self.user_ids)
+
+    def test_resume_past_end(self):
+        """Test that resuming after the last user yields no pages."""
+        token = lazy_paginate.encode_resume_token(self.user_ids[-1])
+        self.assertEqual(list(lazy_pagination(50, keyset=True, resume_token=token)), [])
+
+    def test_paginate_users_after(self):
+        """Test a single keyset page on its own connection."""
+        page = paginate_users_after(10, self.user_ids[99])
+        self.assertEqual([row['user_id'] for row in page], self.user_ids[100:110])
+        self.assertEqual([row['user_id'] for row in paginate_users_after(3)],
+                         self.user_ids[:3])
+        self.assert_released()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Unit tests for merge_join.py
+"""
+import csv
+import os
+import random
+import tempfile
+import unittest
+from parameterized import parameterized
+from merge_join import enrich_users, external_sort_csv, merge_join, read_sorted_csv
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+
+def write_csv(path, rows, fieldnames=('user_id', 'plan')):
+    """Writes dict rows to a CSV file with a header."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class TestMergeJoin(unittest.TestCase):
+    """
+    Test case for merge_join.merge_join
+    """
+    left = [{'user_id': key} for key in ('a', 'b', 'b', 'c', 'e')]
+    right = [{'user_id': key, 'n': n}
+             for n, key in enumerate(('b', 'b', 'c', 'd', 'e'))]
+
+    @parameterized.expand([
+        ('inner', [('b', 0), ('b', 1), ('b', 0), ('b', 1), ('c', 2), ('e', 4)]),
+        ('left', [('a', None), ('b', 0), ('b', 1), ('b', 0), ('b', 1),
+                  ('c', 2), ('e', 4)]),
+    ])
+    def test_join(self, how, expected):
+        """Test inner and left joins, including many-to-many keys."""
+        pairs = merge_join(iter(self.left), iter(self.right), how=how)
+        self.assertEqual(
+            [(left['user_id'], right and right['n']) for left, right in pairs], expected)
+
+    def test_tuple_keys(self):
+        """Test that keys can be tuple indexes on either side."""
+        pairs = list(merge_join([(1, 'x'), (2, 'y')], [('z', 2)], 0, 1))
+        self.assertEqual(pairs, [((2, 'y'), ('z', 2))])
+
+    @parameterized.expand([
+        ('left', [{'user_id': 'b'}, {'user_id': 'a'}], [{'user_id': 'a'}]),
+        ('right', [{'user_id': 'c'}], [{'user_id': 'b'}, {'user_id': 'a'}]),
+    ])
+    def test_unsorted(self, side, left, right):
+        """Test that an unsorted input raises ValueError."""
+        with self.assertRaises(ValueError) as cm:
+            list(merge_join(left, right))
+        self.assertIn(side, str(cm.exception))
+
+    def test_unsupported_join(self):
+        """Test that only inner and left joins are supported."""
+        with self.assertRaises(ValueError):
+            list(merge_join([], [], how='outer'))
+
+
+class TestCsvInputs(unittest.TestCase):
+    """
+    Test case for merge_join.read_sorted_csv and external_sort_csv
+    """
+    def setUp(self):
+        """Writes a shuffled CSV file."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'plans.csv')
+        self.keys = [f"{i:05d}" for i in range(1000)]
+        shuffled = list(self.keys)
+        random.Random(5).shuffle(shuffled)
+        write_csv(self.path, [{'user_id': key, 'plan': 'pro'} for key in shuffled])
+
+    def tearDown(self):
+        """Removes the CSV file and any sorted runs."""
+        self.tmpdir.cleanup()
+
+    @parameterized.expand([
+        (100,),
+        (5000,),
+    ])
+    def test_external_sort(self, chunk_rows):
+        """Test sorting with spilled runs and entirely in memory."""
+        rows = list(external_sort_csv(self.path, chunk_rows=chunk_rows,
+                                      tmpdir=self.tmpdir.name))
+        self.assertEqual([row['user_id'] for row in rows], self.keys)
+        self.assertEqual(os.listdir(self.tmpdir.name), ['plans.csv'])
+
+    def test_external_sort_closed_early(self):
+        """Test that closing the generator removes the sorted runs."""
+        rows = external_sort_csv(self.path, chunk_rows=100, tmpdir=self.tmpdir.name)
+        next(rows)
+        rows.close()
+        self.assertEqual(os.listdir(self.tmpdir.name), ['plans.csv'])
+
+    def test_read_sorted_csv(self):
+        """Test that read_sorted_csv rejects a file out of order."""
+        with self.assertRaises(ValueError):
+            list(read_sorted_csv(self.path))
+
+
+class TestEnrichUsers(unittest.TestCase):
+    """
+    Integration test: enrich_users joins the SQLite stand-in with a CSV.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users and writes a plan for every third one."""
+        use_sqlite_users(cls)
+        cls.user_ids = sorted(user_id for user_id, _, _, _ in USERS)
+        cls.plans = {user[0]: f"plan{i}" for i, user in enumerate(USERS[::3])}
+        cls.path = os.path.join(cls._workdir.name, 'plans.csv')
+        rows = [{'user_id': user_id, 'plan': plan} for user_id, plan in cls.plans.items()]
+        write_csv(cls.path, rows + [{'user_id': 'not-a-user', 'plan': 'none'}])
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    @parameterized.expand([
+        ('left',),
+        ('inner',),
+    ])
+    def test_enrich_users(self, how):
+        """Test that every user gets its plan, in user_id order."""
+        pairs = list(enrich_users(self.path, how=how, batch_size=64, chunk_rows=50,
+                                  tmpdir=self._workdir.name))
+        expected = [user_id for user_id in self.user_ids
+                    if how == 'left' or user_id in self.plans]
+        self.assertEqual([user['user_id'] for user, _ in pairs], expected)
+        for user, row in pairs:
+            self.assertEqual(row and row['plan'], self.plans.get(user['user_id']))
+
+    def test_enrich_users_presorted(self):
+        """Test that an unsorted file is rejected with presorted=True."""
+        with self.assertRaises(ValueError):
+            list(enrich_users(self.path, presorted=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
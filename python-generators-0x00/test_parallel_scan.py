@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for parallel_scan.py
+"""
+import multiprocessing
+import os
+import unittest
+from unittest.mock import patch
+from parameterized import parameterized
+import parallel_scan
+from parallel_scan import (map_partitions, parallel_stream_users_in_batches,
+                           partition_conditions)
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+
+def count_rows(batches):
+    """Partition job: the number of rows in the partition."""
+    return sum(len(batch) for batch in batches)
+
+
+def exit_abruptly(batches):
+    """Partition job that dies without reporting, like an OOM kill."""
+    os._exit(3)
+
+
+class TestPartitionConditions(unittest.TestCase):
+    """
+    Test case for parallel_scan.partition_conditions
+    """
+    def test_range_bounds(self):
+        """Test that the outer ranges are open-ended and the rest contiguous."""
+        conditions = partition_conditions(4, 'range')
+        self.assertEqual(conditions[0], ("user_id < %s", ('40000000',)))
+        self.assertEqual(conditions[1][1], ('40000000', '80000000'))
+        self.assertEqual(conditions[-1], ("user_id >= %s", ('c0000000',)))
+
+    @parameterized.expand([
+        ('hash',),
+        ('range',),
+    ])
+    def test_single_partition(self, mode):
+        """Test that a single partition covers the whole table."""
+        self.assertEqual(len(partition_conditions(1, mode)), 1)
+
+    @parameterized.expand([
+        (0, 'hash'),
+        (2, 'modulo'),
+    ])
+    def test_invalid(self, partitions, mode):
+        """Test that bad partition counts and modes are rejected."""
+        with self.assertRaises(ValueError):
+            partition_conditions(partitions, mode)
+
+
+class TestParallelScan(unittest.TestCase):
+    """
+    Integration test: parallel scans of the SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users, plus a key sorting below '0'."""
+        use_sqlite_users(cls)
+        cls.user_ids = sorted([user_id for user_id, _, _, _ in USERS] + ['!first'])
+        connection = parallel_scan.get_connection()
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO user_data (user_id, name, email, age) "
+                       "VALUES ('!first', 'First', 'first@example.com', 30)")
+        cursor.close()
+        connection.commit()
+        parallel_scan.release_connection(connection)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    @parameterized.expand([
+        ('hash', False),
+        ('range', False),
+        ('hash', True),
+        ('range', True),
+    ])
+    def test_stream(self, mode, ordered):
+        """Test that every row comes back once, in order when asked."""
+        batches = parallel_stream_users_in_batches(3, 64, mode=mode, ordered=ordered)
+        user_ids = [row['user_id'] for batch in batches for row in batch]
+        if ordered:
+            self.assertEqual(user_ids, self.user_ids)
+        else:
+            self.assertEqual(sorted(user_ids), self.user_ids)
+
+    def test_map_partitions(self):
+        """Test that the partial results cover the table."""
+        self.assertEqual(sum(map_partitions(count_rows, 3, mode='range')),
+                         len(self.user_ids))
+
+    def test_dead_worker(self):
+        """Test that a worker dying without a result raises, not hangs."""
+        with patch.object(parallel_scan, 'POLL_INTERVAL', 0.1):
+            with self.assertRaises(RuntimeError) as cm:
+                map_partitions(exit_abruptly, 2)
+        self.assertIn('exited with code 3', str(cm.exception))
+
+    def test_spawned_workers_use_the_pool(self):
+        """Test that spawned workers are pointed at the parent's database."""
+        spawn = multiprocessing.get_context('spawn')
+        with patch.object(parallel_scan, 'multiprocessing', spawn):
+            self.assertEqual(sum(map_partitions(count_rows, 2)), len(self.user_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pipeline.py
+"""
+import csv
+import json
+import os
+import tempfile
+import unittest
+from parameterized import parameterized
+import seed
+from pipeline import Pipeline
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+stream_users = __import__('0-stream_users').stream_users
+
+ROWS = [{'user_id': str(i), 'name': f"User {i}", 'age': 20 + i % 30} for i in range(100)]
+
+
+class ClosableRows:
+    """An iterable source that records whether it was closed."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.rows)
+
+    def close(self):
+        """Marks the source closed."""
+        self.closed = True
+
+
+class TestStages(unittest.TestCase):
+    """
+    Test case for the lazy Pipeline stages
+    """
+    def test_filter_map(self):
+        """Test that fused filter and map stages run in order."""
+        ages = (Pipeline(ROWS)
+                .filter(lambda row: row['age'] > 40)
+                .map(lambda row: row['age'])
+                .filter(lambda age: age % 2 == 0)
+                .collect())
+        self.assertEqual(ages, [row['age'] for row in ROWS
+                                if row['age'] > 40 and row['age'] % 2 == 0])
+
+    def test_lazy(self):
+        """Test that nothing runs before the pipeline is iterated."""
+        seen = []
+        pipeline = Pipeline(ROWS).map(seen.append)
+        self.assertEqual(seen, [])
+        self.assertEqual(pipeline.count(), len(ROWS))
+        self.assertEqual(seen, ROWS)
+
+    def test_batch_flatten(self):
+        """Test that batch and flatten undo each other."""
+        batches = Pipeline(ROWS).batch(30).collect()
+        self.assertEqual([len(batch) for batch in batches], [30, 30, 30, 10])
+        self.assertEqual(Pipeline(batches).flatten().collect(), ROWS)
+
+    @parameterized.expand([
+        ('tumbling', 3, None, [(0, 1, 2), (3, 4, 5)]),
+        ('sliding', 3, 2, [(0, 1, 2), (2, 3, 4), (4, 5, 6)]),
+    ])
+    def test_window(self, _, size, step, expected):
+        """Test tumbling and sliding windows."""
+        self.assertEqual(Pipeline(range(7)).window(size, step).collect(), expected)
+
+    def test_take_closes_source(self):
+        """Test that take() stops early and closes the source."""
+        source = ClosableRows(ROWS)
+        self.assertEqual(Pipeline(source).take(5).count(), 5)
+        self.assertTrue(source.closed)
+
+    def test_reduce(self):
+        """Test folding the rows into one value."""
+        total = Pipeline(ROWS).reduce(lambda acc, row: acc + row['age'], 0)
+        self.assertEqual(total, sum(row['age'] for row in ROWS))
+
+
+class TestFileSinks(unittest.TestCase):
+    """
+    Test case for Pipeline.to_csv and Pipeline.to_jsonl
+    """
+    def setUp(self):
+        """Creates a directory for the output files."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Removes the output files."""
+        self.tmpdir.cleanup()
+
+    def read_csv(self, name):
+        """Returns the rows of an output CSV file as lists of strings."""
+        with open(os.path.join(self.tmpdir.name, name), newline='', encoding='utf-8') as f:
+            return list(csv.reader(f))
+
+    @parameterized.expand([
+        ('all_keys', None, ['user_id', 'name', 'age']),
+        ('subset', ['user_id', 'age'], ['user_id', 'age']),
+    ])
+    def test_to_csv_dicts(self, _, columns, header):
+        """Test dict rows under their own keys and under a subset of them."""
+        path = os.path.join(self.tmpdir.name, 'users.csv')
+        written = Pipeline(ROWS).to_csv(path, columns=columns, chunk_size=30)
+        self.assertEqual(written, len(ROWS))
+        rows = self.read_csv('users.csv')
+        self.assertEqual(rows[0], header)
+        self.assertEqual(rows[1:], [[str(row[column]) for column in header] for row in ROWS])
+
+    @parameterized.expand([
+        ('header', ['user_id', 'age']),
+        ('no_header', None),
+    ])
+    def test_to_csv_tuples(self, _, columns):
+        """Test that tuple rows get a header only when columns are given."""
+        path = os.path.join(self.tmpdir.name, 'users.csv')
+        Pipeline(ROWS).map(lambda row: (row['user_id'], row['age'])).to_csv(path, columns)
+        rows = self.read_csv('users.csv')
+        if columns:
+            self.assertEqual(rows.pop(0), columns)
+        self.assertEqual(rows, [[row['user_id'], str(row['age'])] for row in ROWS])
+
+    def test_to_csv_empty(self):
+        """Test that an empty pipeline writes an empty file."""
+        path = os.path.join(self.tmpdir.name, 'users.csv')
+        self.assertEqual(Pipeline([]).to_csv(path), 0)
+        self.assertEqual(self.read_csv('users.csv'), [])
+
+    def test_to_jsonl(self):
+        """Test that every row is written as one JSON line."""
+        path = os.path.join(self.tmpdir.name, 'users.jsonl')
+        self.assertEqual(Pipeline(ROWS).to_jsonl(path, chunk_size=30), len(ROWS))
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], ROWS)
+
+
+class TestTableSink(unittest.TestCase):
+    """
+    Integration test: Pipeline.to_table from stream_users, backed by the
+    SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users and creates the target table."""
+        use_sqlite_users(cls)
+        with seed.pooled_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("CREATE TABLE adults (user_id VARCHAR(255), email VARCHAR(255))")
+            cursor.close()
+            connection.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def setUp(self):
+        """Empties the target table."""
+        with seed.pooled_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM adults")
+            cursor.close()
+            connection.commit()
+
+    def table(self):
+        """Returns the (user_id, email) rows of the target table."""
+        with seed.pooled_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT user_id, email FROM adults ORDER BY user_id")
+            rows = cursor.fetchall()
+            cursor.close()
+        return [tuple(row) for row in rows]
+
+    @parameterized.expand([
+        ('dicts', lambda row: {'user_id': row['user_id'], 'email': row['email']}, None),
+        ('dict_subset', lambda row: row, ['user_id', 'email']),
+        ('tuples', lambda row: (row['user_id'], row['email']), ['user_id', 'email']),
+    ])
+    def test_to_table(self, _, shape, columns):
+        """Test inserting dict and tuple rows in chunks."""
+        inserted = (Pipeline(stream_users())
+                    .filter(lambda row: row['age'] >= 40)
+                    .map(shape)
+                    .to_table('adults', columns, chunk_size=64))
+        expected = sorted((user_id, email) for user_id, _, email, age in USERS if age >= 40)
+        self.assertEqual(inserted, len(expected))
+        self.assertEqual(self.table(), expected)
+
+    def test_tuples_need_columns(self):
+        """Test that tuple rows without columns are rejected."""
+        with self.assertRaises(ValueError):
+            Pipeline([('a', 'b')]).to_table('adults')
+
+    def test_invalid_identifier(self):
+        """Test that table and column names are checked before use."""
+        with self.assertRaises(ValueError):
+            Pipeline([{'user_id': 'a'}]).to_table('adults; DROP TABLE user_data')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Unit tests for prefetch.py
+"""
+import threading
+import time
+import unittest
+from parameterized import parameterized
+import seed
+from prefetch import read_ahead
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+
+
+class Source:
+    """A generator source that records how far and on which thread it ran."""
+
+    def __init__(self, count=100, fail_at=None):
+        self.count = count
+        self.fail_at = fail_at
+        self.produced = 0
+        self.closed_on = None
+
+    def __iter__(self):
+        try:
+            for i in range(self.count):
+                if i == self.fail_at:
+                    raise KeyError('boom')
+                self.produced += 1
+                yield i
+        finally:
+            self.closed_on = threading.current_thread().name
+
+
+def read_ahead_threads():
+    """The read-ahead producer threads still alive."""
+    return [thread for thread in threading.enumerate() if thread.name == 'read-ahead']
+
+
+class TestReadAhead(unittest.TestCase):
+    """
+    Test case for prefetch.read_ahead
+    """
+    @parameterized.expand([
+        (0,),
+        (1,),
+        (4,),
+    ])
+    def test_order(self, depth):
+        """Test that every item comes through, in order."""
+        self.assertEqual(list(read_ahead(Source(), depth)), list(range(100)))
+        self.assertEqual(read_ahead_threads(), [])
+
+    def test_bounded(self):
+        """Test that the producer stays at most depth items ahead."""
+        source = Source()
+        items = read_ahead(iter(source), depth=3)
+        next(items)
+        time.sleep(0.2)
+        # One item consumed, three queued and one waiting to be queued
+        self.assertLessEqual(source.produced, 5)
+        items.close()
+
+    def test_error(self):
+        """Test that a source error is raised after the items before it."""
+        received = []
+        with self.assertRaises(KeyError):
+            for item in read_ahead(Source(fail_at=10), depth=2):
+                received.append(item)
+        self.assertEqual(received, list(range(10)))
+        self.assertEqual(read_ahead_threads(), [])
+
+    @parameterized.expand([
+        ('blocked_producer', 0.2),
+        ('immediately', 0),
+    ])
+    def test_early_close(self, _, wait):
+        """Test that closing early stops, closes and joins the producer."""
+        source = Source(count=10000)
+        items = read_ahead(iter(source), depth=2)
+        self.assertEqual(next(items), 0)
+        time.sleep(wait)
+        started = time.monotonic()
+        items.close()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(source.closed_on, 'read-ahead')
+        self.assertLess(source.produced, 10000)
+        self.assertEqual(read_ahead_threads(), [])
+
+
+class TestPrefetchedBatches(unittest.TestCase):
+    """
+    Integration test: stream_users_in_batches(prefetch=...), backed by the
+    SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def test_all_batches(self):
+        """Test that prefetched batches hold every user."""
+        batches = list(stream_users_in_batches(64, prefetch=2))
+        self.assertEqual(sum(len(batch) for batch in batches), len(USERS))
+
+    def test_early_close_releases_connection(self):
+        """Test that stopping a prefetched stream returns its connection."""
+        batches = stream_users_in_batches(16, prefetch=2)
+        next(batches)
+        batches.close()
+        self.assertEqual(seed.get_pool().get_stats()['checked_out'], 0)
+        self.assertEqual(read_ahead_threads(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
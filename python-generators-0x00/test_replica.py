@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Unit tests for replica.py
+"""
+import functools
+import os
+import time
+import unittest
+import mysql.connector
+import seed
+import sqlite_backend
+from replica import (ANALYTICS_INDEXES, ReplicaRefresher, refresh_replica,
+                     replica_watermark, use_replica)
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+stream_users = __import__('0-stream_users').stream_users
+
+
+class FailingSource:
+    """
+    Opens primary connections whose queries fail after a number of
+    successful ones, like a primary going away mid-refresh.
+    """
+
+    def __init__(self, path, queries):
+        self.path = path
+        self.queries = queries
+
+    def __call__(self):
+        connection = sqlite_backend.connect(self.path)
+        cursor_of = connection.cursor
+
+        def cursor(*args, **kwargs):
+            cursor = cursor_of(*args, **kwargs)
+            execute = cursor.execute
+
+            def failing_execute(query, params=()):
+                if self.queries == 0:
+                    raise mysql.connector.OperationalError("Lost connection to server")
+                self.queries -= 1
+                return execute(query, params)
+
+            cursor.execute = failing_execute
+            return cursor
+
+        connection.cursor = cursor
+        return connection
+
+
+class TestRefreshReplica(unittest.TestCase):
+    """
+    Integration test: refresh_replica from a SQLite stand-in primary.
+    """
+    def setUp(self):
+        """Loads the fixture users into a fresh primary."""
+        use_sqlite_users(self)
+        self.primary = os.path.join(self._workdir.name, 'users.db')
+        self.source = functools.partial(sqlite_backend.connect, self.primary)
+        self.mirror = os.path.join(self._workdir.name, 'mirror.db')
+
+    def tearDown(self):
+        """Drops the primary and the mirror."""
+        drop_sqlite_users(self)
+
+    def execute(self, path, query, params=()):
+        """Runs one statement on the database at path and returns its rows."""
+        connection = sqlite_backend.connect(path)
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        connection.commit()
+        connection.close()
+        return rows
+
+    def users(self, path):
+        """Returns the (user_id, name, email, age) rows at path, by user_id."""
+        rows = self.execute(path, "SELECT user_id, name, email, age FROM user_data "
+                                  "ORDER BY user_id")
+        return [(user_id, name, email, float(age)) for user_id, name, email, age in rows]
+
+    def watermark(self):
+        """Returns the watermark stored in the mirror."""
+        connection = sqlite_backend.connect(self.mirror)
+        try:
+            return replica_watermark(connection)
+        finally:
+            connection.close()
+
+    def test_first_refresh(self):
+        """Test that the first refresh copies the whole table and indexes it."""
+        summary = refresh_replica(self.mirror, source=self.source, batch_size=64)
+        self.assertEqual(summary['rows'], len(USERS))
+        self.assertEqual(self.users(self.mirror), self.users(self.primary))
+        self.assertEqual(summary['watermark'], self.watermark())
+        indexes = {name for (name,) in self.execute(
+            self.mirror, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue(set(ANALYTICS_INDEXES) <= indexes)
+
+    def test_incremental_refresh(self):
+        """Test that later refreshes copy only inserted and updated rows."""
+        refresh_replica(self.mirror, source=self.source)
+        self.assertEqual(refresh_replica(self.mirror, source=self.source)['rows'], 0)
+        # Let the clock move past the watermark's millisecond
+        time.sleep(0.01)
+        changed = sorted(user_id for user_id, _, _, _ in USERS[:3])
+        self.execute(self.primary, "UPDATE user_data SET age = 99 WHERE user_id IN "
+                                   "(%s, %s, %s)", tuple(changed))
+        for i in range(2):
+            self.execute(self.primary, "INSERT INTO user_data (user_id, name, email, age) "
+                                       "VALUES (%s, %s, %s, %s)",
+                         (f"new-{i}", f"New {i}", f"new{i}@example.com", 30))
+        summary = refresh_replica(self.mirror, source=self.source, batch_size=2)
+        self.assertEqual(summary['rows'], 5)
+        self.assertEqual(summary['watermark']['user_id'], 'new-1')
+        self.assertEqual(self.users(self.mirror), self.users(self.primary))
+
+    def test_interrupted_refresh(self):
+        """Test that a refresh failing mid-way resumes from its last batch."""
+        with self.assertRaises(mysql.connector.OperationalError):
+            refresh_replica(self.mirror, source=FailingSource(self.primary, 2), batch_size=64)
+        self.assertEqual(len(self.users(self.mirror)), 128)
+        (last_copied,) = self.execute(self.primary, "SELECT user_id FROM user_data "
+                                                    "ORDER BY updated_at, user_id "
+                                                    "LIMIT 1 OFFSET 127")[0]
+        self.assertEqual(self.watermark()['user_id'], last_copied)
+        summary = refresh_replica(self.mirror, source=self.source, batch_size=64)
+        self.assertEqual(summary['rows'], len(USERS) - 128)
+        self.assertEqual(self.users(self.mirror), self.users(self.primary))
+
+    def test_full_refresh(self):
+        """Test that full=True drops rows deleted on the primary."""
+        refresh_replica(self.mirror, source=self.source)
+        self.execute(self.primary, "DELETE FROM user_data WHERE user_id = %s", (USERS[0][0],))
+        refresh_replica(self.mirror, source=self.source)
+        self.assertEqual(len(self.users(self.mirror)), len(USERS))
+        summary = refresh_replica(self.mirror, source=self.source, full=True)
+        self.assertEqual(summary['rows'], len(USERS) - 1)
+        self.assertEqual(self.users(self.mirror), self.users(self.primary))
+
+    def test_primary_unreachable(self):
+        """Test that a failed connection to the primary raises."""
+        with self.assertRaises(RuntimeError):
+            refresh_replica(self.mirror, source=lambda: None)
+
+    def test_use_replica(self):
+        """Test that the generators read from the mirror once it is in use."""
+        refresh_replica(self.mirror, source=self.source)
+        self.execute(self.primary, "DELETE FROM user_data")
+        use_replica(self.mirror)
+        self.assertEqual(sum(1 for _ in stream_users()), len(USERS))
+        self.assertEqual(seed.get_pool().get_stats()['checked_out'], 0)
+
+    def test_refresher(self):
+        """Test that the background refresher refreshes until stopped."""
+        refresher = ReplicaRefresher(self.mirror, interval=0.05, source=self.source)
+        refresher.start()
+        deadline = time.monotonic() + 5
+        while refresher.last is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        refresher.stop()
+        self.assertFalse(refresher.is_alive())
+        self.assertEqual(len(self.users(self.mirror)), len(USERS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Unit tests for seed.py
+"""
+import contextlib
+import csv
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from parameterized import parameterized
+import mysql.connector
+import seed
+import sqlite_backend
+from seed import ConnectionPool, load_checkpoint, upsert_data
+
+# The SQLite stand-in spells INSERT ... ON DUPLICATE KEY UPDATE this way
+SQLITE_UPSERT = ("INSERT OR REPLACE INTO user_data (user_id, name, email, age) "
+                 "VALUES (%s, %s, %s, %s)")
+
+
+class FakeConnection:
+    """A stand-in for a MySQL connection that records how it is used."""
+
+    def __init__(self):
+        self.closed = False
+        self.unread_result = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        """Connected until closed."""
+        return not self.closed
+
+    def rollback(self):
+        """Counts rollbacks."""
+        self.rollbacks += 1
+
+    def close(self):
+        """Marks the connection closed."""
+        self.closed = True
+
+
+class SlowConnect:
+    """A connect factory that takes a while and counts its calls."""
+
+    def __init__(self, delay=0.05, fail=0):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            failing = self.calls <= self.fail
+        time.sleep(self.delay)
+        return None if failing else FakeConnection()
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    Test case for seed.ConnectionPool
+    """
+    def test_reuse(self):
+        """Test that a released connection is handed out again."""
+        pool = ConnectionPool(size=2, connect=FakeConnection)
+        connection = pool.get_connection()
+        pool.release_connection(connection)
+        self.assertIs(pool.get_connection(), connection)
+        self.assertEqual(connection.rollbacks, 1)
+        stats = pool.get_stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['checked_out']), (1, 1, 1))
+
+    @parameterized.expand([
+        ('unread_result', lambda connection: setattr(connection, 'unread_result', True)),
+        ('disconnected', lambda connection: connection.close()),
+    ])
+    def test_discard(self, _, spoil):
+        """Test that unusable connections are closed, not reused."""
+        pool = ConnectionPool(size=1, connect=FakeConnection)
+        connection = pool.get_connection()
+        spoil(connection)
+        pool.release_connection(connection)
+        self.assertIsNot(pool.get_connection(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()['discarded'], 1)
+
+    def test_overflow_closed_on_release(self):
+        """Test that overflow connections are opened past size and closed."""
+        pool = ConnectionPool(size=1, max_overflow=1, connect=FakeConnection)
+        pooled, extra = pool.get_connection(), pool.get_connection()
+        self.assertIsNotNone(extra)
+        pool.release_connection(extra)
+        self.assertTrue(extra.closed)
+        pool.release_connection(pooled)
+        self.assertFalse(pooled.closed)
+        self.assertEqual(pool.get_stats()['checked_out'], 0)
+
+    def test_timeout(self):
+        """Test that an exhausted pool gives up after its timeout."""
+        pool = ConnectionPool(size=1, max_overflow=0, connect=FakeConnection, timeout=0.05)
+        self.assertIsNotNone(pool.get_connection())
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            started = time.monotonic()
+            self.assertIsNone(pool.get_connection())
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIn('timed out', output.getvalue())
+
+    def test_overflow_limit_concurrent(self):
+        """Test that concurrent callers never exceed max_overflow."""
+        pool = ConnectionPool(size=1, max_overflow=2, connect=SlowConnect(), timeout=0.2)
+        barrier = threading.Barrier(8)
+        connections = []
+
+        def checkout():
+            barrier.wait()
+            connections.append(pool.get_connection())
+
+        threads = [threading.Thread(target=checkout) for _ in range(8)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sum(connection is not None for connection in connections), 3)
+        self.assertEqual(pool.get_stats()['overflow'], 2)
+
+    def test_failed_overflow_gives_slot_back(self):
+        """Test that an overflow connect failure does not use up the slot."""
+        connect = SlowConnect(delay=0)
+        pool = ConnectionPool(size=1, max_overflow=1, connect=connect)
+        self.assertIsNotNone(pool.get_connection())
+        connect.fail = connect.calls + 1
+        self.assertIsNone(pool.get_connection())
+        self.assertIsNotNone(pool.get_connection())
+
+    def test_close(self):
+        """Test that close() drops idle connections and later releases."""
+        pool = ConnectionPool(size=2, connect=FakeConnection)
+        idle, busy = pool.get_connection(), pool.get_connection()
+        pool.release_connection(idle)
+        pool.close()
+        self.assertTrue(idle.closed)
+        pool.release_connection(busy)
+        self.assertTrue(busy.closed)
+
+
+class TestSharedPool(unittest.TestCase):
+    """
+    Test case for seed.configure_pool and the module-level helpers
+    """
+    def tearDown(self):
+        """Closes the shared pool used by the test."""
+        seed.get_pool().close()
+
+    def test_release_to_owner(self):
+        """Test that a connection returns to the pool that handed it out."""
+        first = seed.configure_pool(connect=FakeConnection)
+        connection = seed.get_connection()
+        second = seed.configure_pool(connect=FakeConnection)
+        seed.release_connection(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(first.get_stats()['checked_out'], 0)
+        self.assertEqual(second.get_stats()['checked_out'], 0)
+        self.assertEqual(second.get_stats()['idle'], 0)
+
+    def test_pooled_connection(self):
+        """Test that pooled_connection always releases its connection."""
+        pool = seed.configure_pool(connect=FakeConnection)
+        with self.assertRaises(KeyError):
+            with seed.pooled_connection():
+                raise KeyError('boom')
+        self.assertEqual(pool.get_stats()['checked_out'], 0)
+
+
+class FailingCommits:
+    """Wraps a connection so that commit number fail_at raises."""
+
+    def __init__(self, connection, fail_at):
+        self.connection = connection
+        self.fail_at = fail_at
+        self.commits = 0
+
+    def cursor(self, *args, **kwargs):
+        """Delegates to the wrapped connection."""
+        return self.connection.cursor(*args, **kwargs)
+
+    def commit(self):
+        """Raises on the configured commit."""
+        self.commits += 1
+        if self.commits == self.fail_at:
+            raise mysql.connector.Error("lost connection")
+        self.connection.commit()
+
+
+@patch('seed.UPSERT_QUERY', SQLITE_UPSERT)
+class TestUpsertData(unittest.TestCase):
+    """
+    Test case for seed.upsert_data, on the SQLite stand-in
+    """
+    def setUp(self):
+        """Writes a CSV of 1000 rows, with a blank line, and opens a database."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'user_data.csv')
+        self.rows = [[f"id{i:04d}", f"User {i}", f"user{i}@example.com", str(18 + i % 60)]
+                     for i in range(1000)]
+        self.write_csv()
+        self.connection = sqlite_backend.connect(os.path.join(self.tmpdir.name, 'users.db'))
+        sqlite_backend.create_table(self.connection)
+
+    def tearDown(self):
+        """Closes the database and removes the files."""
+        self.connection.close()
+        self.tmpdir.cleanup()
+
+    def write_csv(self):
+        """Writes self.rows with a header and a blank line after row 10."""
+        with open(self.path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'name', 'email', 'age'])
+            writer.writerows(self.rows[:10])
+            f.write('\r\n')
+            writer.writerows(self.rows[10:])
+        # Make every rewrite visible even on filesystems with coarse mtimes
+        self.mtime = getattr(self, 'mtime', time.time_ns()) + 10 ** 9
+        os.utime(self.path, ns=(self.mtime, self.mtime))
+
+    def upsert(self, connection=None, **options):
+        """Runs upsert_data and returns (rows upserted, chunks loaded, skipped)."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            upsert_data(connection or self.connection, self.path, chunk_size=100, **options)
+        match = re.search(r"Upserted (\d+) rows in (\d+) chunks, skipped (\d+)",
+                          output.getvalue())
+        self.assertIsNotNone(match, output.getvalue())
+        return tuple(map(int, match.groups()))
+
+    def table(self):
+        """Returns the user_data rows as lists of strings, by user_id."""
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT user_id, name, email, age FROM user_data ORDER BY user_id")
+        rows = [[user_id, name, email, str(int(age))]
+                for user_id, name, email, age in cursor.fetchall()]
+        cursor.close()
+        return rows
+
+    def test_first_load(self):
+        """Test that every row is loaded and blank lines are not counted."""
+        self.assertEqual(self.upsert(), (1000, 11, 0))
+        self.assertEqual(self.table(), self.rows)
+        state = load_checkpoint(self.path + '.checkpoint')
+        self.assertEqual((state['rows'], state['chunks']), (1000, 11))
+
+    def test_unchanged(self):
+        """Test that a rerun on the same file loads nothing."""
+        self.upsert()
+        self.assertEqual(self.upsert(), (0, 0, 11))
+
+    @parameterized.expand([
+        ('same_length', '77'),
+        ('longer_line', '101'),
+    ])
+    def test_edit_one_row(self, _, age):
+        """Test that editing a row in the middle reloads only its chunk."""
+        self.upsert()
+        self.rows[505][3] = age
+        self.write_csv()
+        self.assertEqual(self.upsert(), (100, 1, 10))
+        self.assertEqual(self.table(), self.rows)
+        self.assertEqual(self.upsert(), (0, 0, 11))
+
+    def test_append_rows(self):
+        """Test that appended rows are loaded without rereading the rest."""
+        self.upsert()
+        self.rows += [[f"id{i:04d}", f"User {i}", f"user{i}@example.com", "40"]
+                      for i in range(1000, 1250)]
+        self.write_csv()
+        with patch('seed._matching_prefix', wraps=seed._matching_prefix) as matching:
+            # The old last chunk was partial, so the new rows start a chunk of their own
+            self.assertEqual(self.upsert(), (250, 3, 11))
+        matching.assert_called_once()
+        self.assertEqual(self.table(), self.rows)
+        self.assertEqual(load_checkpoint(self.path + '.checkpoint')['rows'], 1250)
+
+    def test_truncated_file(self):
+        """Test that chunks past the end of a shortened file are forgotten."""
+        self.upsert()
+        self.rows[0][1] = 'First'
+        del self.rows[500:]
+        self.write_csv()
+        # The edited first chunk and the now shorter last chunk are reloaded
+        self.assertEqual(self.upsert(), (100, 2, 4))
+        state = load_checkpoint(self.path + '.checkpoint')
+        self.assertEqual((state['rows'], state['chunks']), (500, 6))
+
+    def test_resume_after_failure(self):
+        """Test that a failed load resumes from its last checkpoint."""
+        failing = FailingCommits(self.connection, fail_at=6)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            upsert_data(failing, self.path, chunk_size=100, checkpoint_every=2)
+        self.assertIn('Error upserting data', output.getvalue())
+        self.assertEqual(load_checkpoint(self.path + '.checkpoint')['chunks'], 4)
+        # Chunks 4 to 10; the first chunk held the blank line, the last one row
+        self.assertEqual(self.upsert(), (601, 7, 4))
+        self.assertEqual(self.table(), self.rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit tests for shared_batches.py
+"""
+import os
+import unittest
+from unittest.mock import patch
+from parameterized import parameterized
+import shared_batches
+from columnar import ColumnarBatch
+from shared_batches import (SharedBatchRing, map_shared_batches, pack_batch,
+                            packed_size, unpack_batch)
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+NAMES = ('user_id', 'name', 'age')
+
+
+def batch_of(rows):
+    """Builds a ColumnarBatch from (user_id, name, age) tuples."""
+    return ColumnarBatch.from_rows(NAMES, rows)
+
+
+def age_total(batch):
+    """Worker function: the number of rows and the sum of their ages."""
+    return len(batch), batch.sum('age')
+
+
+def fail(batch):
+    """Worker function that always raises."""
+    raise KeyError('boom')
+
+
+def column_view(batch):
+    """Worker function returning the zero-copy view, which cannot be pickled."""
+    return batch['age']
+
+
+def exit_abruptly(batch):
+    """Worker function that dies without reporting, like an OOM kill."""
+    os._exit(3)
+
+
+class TestPackBatch(unittest.TestCase):
+    """
+    Test case for shared_batches.pack_batch and unpack_batch
+    """
+    @parameterized.expand([
+        ([],),
+        ([('a', 'Ann', 30)],),
+        ([('a', 'Ann', 30), ('b', 'Zoë Ñúñez', 41.5), ('c', '', 18)],),
+    ])
+    def test_round_trip(self, rows):
+        """Test that a batch comes back unchanged from a shared buffer."""
+        batch = batch_of(rows)
+        buffer = bytearray(packed_size(batch) + 16)
+        layout = pack_batch(batch, buffer, start=8)
+        unpacked = unpack_batch(buffer, layout)
+        self.assertEqual(len(unpacked), len(rows))
+        self.assertEqual([tuple(row.values()) for row in unpacked.to_dicts()],
+                         [(user_id, name, float(age)) for user_id, name, age in rows])
+
+    def test_packed_size_aligned(self):
+        """Test that every packed batch size is 8-byte aligned."""
+        batch = batch_of([('abc', 'x' * 13, 1)])
+        self.assertEqual(packed_size(batch) % 8, 0)
+        _, columns = pack_batch(batch, bytearray(packed_size(batch)))
+        for _, _, offset, _, data_offset, _ in columns:
+            self.assertEqual(offset % 8, 0)
+            self.assertEqual((data_offset or 0) % 8, 0)
+
+
+class TestSharedBatchRing(unittest.TestCase):
+    """
+    Test case for shared_batches.SharedBatchRing
+    """
+    def test_write_read(self):
+        """Test that a batch written to a slot reads back from it."""
+        with SharedBatchRing(slots=2, slot_bytes=4096) as ring:
+            layout = ring.write(1, batch_of([('a', 'Ann', 30)]))
+            batch = ring.read(1, layout)
+            self.assertEqual(batch['name'][0], 'Ann')
+            del batch
+
+    def test_batch_too_large(self):
+        """Test that a batch larger than a slot is rejected."""
+        with SharedBatchRing(slots=1, slot_bytes=64) as ring:
+            with self.assertRaises(ValueError):
+                ring.write(0, batch_of([('a', 'x' * 100, 30)]))
+
+
+class TestMapSharedBatches(unittest.TestCase):
+    """
+    Test case for shared_batches.map_shared_batches
+    """
+    def test_given_batches(self):
+        """Test columnar and dict-row batches through two workers."""
+        batches = [batch_of([(str(i), 'n', i) for i in range(start, start + 10)])
+                   for start in range(0, 100, 10)]
+        batches.append([{'user_id': 'x', 'name': 'n', 'age': 5}])
+        results = dict(map_shared_batches(age_total, batches, workers=2, slots=3))
+        self.assertEqual(sorted(results), list(range(11)))
+        self.assertEqual(sum(rows for rows, _ in results.values()), 101)
+        self.assertEqual(sum(total for _, total in results.values()), sum(range(100)) + 5)
+
+    def test_worker_error(self):
+        """Test that a failing worker surfaces as RuntimeError."""
+        with self.assertRaises(RuntimeError) as cm:
+            list(map_shared_batches(fail, [batch_of([('a', 'n', 1)])], workers=1))
+        self.assertIn('KeyError', str(cm.exception))
+
+    def test_unpicklable_result(self):
+        """Test that a result that cannot be pickled back raises."""
+        with self.assertRaises(RuntimeError) as cm:
+            list(map_shared_batches(column_view, [batch_of([('a', 'n', 1)])], workers=1))
+        self.assertIn('pickle', str(cm.exception))
+
+    def test_dead_worker(self):
+        """Test that a worker dying without a result raises, not hangs."""
+        with patch.object(shared_batches, 'POLL_INTERVAL', 0.1):
+            with self.assertRaises(RuntimeError) as cm:
+                list(map_shared_batches(exit_abruptly, [batch_of([('a', 'n', 1)])],
+                                        workers=1))
+        self.assertIn('exited with code 3', str(cm.exception))
+
+
+class TestMapSharedUserBatches(unittest.TestCase):
+    """
+    Integration test: map_shared_batches over stream_users_in_batches,
+    backed by the SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def test_stream_batches(self):
+        """Test that every user reaches a worker exactly once."""
+        results = [result for _, result in
+                   map_shared_batches(age_total, workers=2, batch_size=64)]
+        self.assertEqual(len(results), -(-len(USERS) // 64))
+        self.assertEqual(sum(rows for rows, _ in results), len(USERS))
+        self.assertEqual(sum(total for _, total in results),
+                         sum(age for _, _, _, age in USERS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for sketches.py
+"""
+import itertools
+import unittest
+from parameterized import parameterized
+from sketches import BloomFilter, HyperLogLog, count_distinct, dedupe, key_getter
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+stream_users = __import__('0-stream_users').stream_users
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+
+
+class TestKeyGetter(unittest.TestCase):
+    """
+    Test case for sketches.key_getter
+    """
+    @parameterized.expand([
+        ('email', {'email': 'a@example.com'}, 'a@example.com'),
+        (2, ('id', 'name', 'a@example.com'), 'a@example.com'),
+        (lambda row: row['email'].upper(), {'email': 'a'}, 'A'),
+    ])
+    def test_key_getter(self, key, row, expected):
+        """Test column names, tuple indexes and callables."""
+        self.assertEqual(key_getter(key)(row), expected)
+
+
+class TestBloomFilter(unittest.TestCase):
+    """
+    Test case for sketches.BloomFilter
+    """
+    def test_no_false_negatives(self):
+        """Test that every added item is reported as present."""
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f"user{i}")
+        self.assertTrue(all(f"user{i}" in bloom for i in range(1000)))
+        self.assertFalse(bloom.add("user10"))
+        self.assertGreater(bloom.count, 990)
+
+    def test_false_positive_rate(self):
+        """Test that unseen items are rarely reported at capacity."""
+        bloom = BloomFilter(10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(i)
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    @parameterized.expand([
+        (0,),
+        (1,),
+    ])
+    def test_invalid_error_rate(self, error_rate):
+        """Test that the error rate must be strictly between 0 and 1."""
+        with self.assertRaises(ValueError):
+            BloomFilter(10, error_rate)
+
+
+class TestHyperLogLog(unittest.TestCase):
+    """
+    Test case for sketches.HyperLogLog
+    """
+    @parameterized.expand([
+        (10,),
+        (5000,),
+        (100000,),
+    ])
+    def test_count(self, distinct):
+        """Test that the estimate is within 5% of the distinct count."""
+        counter = HyperLogLog()
+        for i in range(distinct):
+            counter.add(f"user{i}@example.com")
+            counter.add(f"user{i}@example.com")
+        self.assertAlmostEqual(counter.count(), distinct, delta=max(1, 0.05 * distinct))
+
+    def test_merge(self):
+        """Test that merged counters count the union."""
+        left, right = HyperLogLog(12), HyperLogLog(12)
+        for i in range(3000):
+            left.add(i)
+        for i in range(2000, 6000):
+            right.add(i)
+        self.assertAlmostEqual(left.merge(right).count(), 6000, delta=300)
+
+    def test_merge_precision_mismatch(self):
+        """Test that counters of different precision cannot be merged."""
+        with self.assertRaises(ValueError):
+            HyperLogLog(12).merge(HyperLogLog(14))
+
+    def test_invalid_precision(self):
+        """Test that the precision is bounded."""
+        with self.assertRaises(ValueError):
+            HyperLogLog(3)
+
+
+class TestStreamOperators(unittest.TestCase):
+    """
+    Integration test: dedupe and count_distinct over the generators,
+    backed by the SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+        cls.emails = {email for _, _, email, _ in USERS}
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def test_dedupe_rows(self):
+        """Test that dedupe keeps one row per email from stream_users."""
+        rows = list(dedupe(stream_users(), key='email', capacity=1000))
+        emails = [row['email'] for row in rows]
+        self.assertEqual(len(emails), len(set(emails)))
+        self.assertEqual(set(emails), self.emails)
+
+    def test_dedupe_tuple_batches(self):
+        """Test dedupe on flattened tuple batches with an index key."""
+        batches = stream_users_in_batches(64, row_factory=tuple)
+        rows = list(dedupe(itertools.chain.from_iterable(batches), key=2, capacity=1000))
+        self.assertEqual(len(rows), len(self.emails))
+
+    def test_count_distinct(self):
+        """Test the distinct email estimate from stream_users."""
+        self.assertAlmostEqual(count_distinct(stream_users(), key='email'),
+                               len(self.emails), delta=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Unit tests for stream_stats.py
+"""
+import random
+import statistics
+import unittest
+from parameterized import parameterized
+from stream_stats import QuantileSketch, RunningStats, summarize, summary_of
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+stream_ages = __import__('4-stream_ages')
+
+
+class TestRunningStats(unittest.TestCase):
+    """
+    Test case for stream_stats.RunningStats
+    """
+    @parameterized.expand([
+        ([5],),
+        ([1, 2, 3, 4],),
+        ([18.5, 120, 33, 33, 47.25, 90, 21],),
+    ])
+    def test_add(self, values):
+        """
+        Test that one pass gives the same figures as the statistics module.
+        """
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(values))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(values))
+        if len(values) > 1:
+            self.assertAlmostEqual(stats.sample_variance, statistics.variance(values))
+        self.assertEqual((stats.min, stats.max), (min(values), max(values)))
+
+    def test_empty(self):
+        """Test that an empty RunningStats reports zeros and no extremes."""
+        stats = RunningStats()
+        self.assertEqual((stats.count, stats.variance, stats.sample_variance), (0, 0.0, 0.0))
+        self.assertIsNone(stats.min)
+
+    def test_merge(self):
+        """Test that merging partial statistics equals a single pass."""
+        rng = random.Random(1)
+        values = [rng.uniform(18, 100) for _ in range(1000)]
+        whole, left, right = RunningStats(), RunningStats(), RunningStats()
+        for index, value in enumerate(values):
+            whole.add(value)
+            (left if index < 300 else right).add(value)
+        merged = RunningStats().merge(left).merge(right).merge(RunningStats())
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.variance, whole.variance)
+        self.assertEqual((merged.min, merged.max), (whole.min, whole.max))
+
+
+class TestQuantileSketch(unittest.TestCase):
+    """
+    Test case for stream_stats.QuantileSketch
+    """
+    def setUp(self):
+        """Shuffles 0..99999 so every quantile has a known value."""
+        self.values = list(range(100000))
+        random.Random(7).shuffle(self.values)
+
+    @parameterized.expand([
+        (0.01,),
+        (0.5,),
+        (0.95,),
+        (0.99,),
+    ])
+    def test_quantile(self, q):
+        """Test that estimates stay within 1% rank error."""
+        sketch = QuantileSketch(seed=3)
+        for value in self.values:
+            sketch.add(value)
+        self.assertAlmostEqual(sketch.quantile(q), q * len(self.values),
+                               delta=0.01 * len(self.values))
+
+    def test_merge(self):
+        """Test that merged sketches estimate the combined stream."""
+        sketches = [QuantileSketch(seed=part) for part in range(4)]
+        for index, value in enumerate(self.values):
+            sketches[index % 4].add(value)
+        merged = sketches[0]
+        for sketch in sketches[1:]:
+            merged.merge(sketch)
+        self.assertEqual(merged.count, len(self.values))
+        self.assertAlmostEqual(merged.percentile(50), 50000, delta=1000)
+
+    def test_bounds(self):
+        """Test that an empty sketch returns None and bad q is rejected."""
+        sketch = QuantileSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+
+class TestSummarize(unittest.TestCase):
+    """
+    Test case for stream_stats.summarize and summary_of
+    """
+    def test_summarize(self):
+        """Test that summarize reports the requested percentiles."""
+        summary = summarize(iter(range(1, 101)), percentiles=(50, 99.5))
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['mean'], 50.5)
+        self.assertEqual((summary['min'], summary['max']), (1, 100))
+        self.assertEqual(summary['p50'], 50)
+        self.assertIn('p99.5', summary)
+
+    def test_summary_of_empty(self):
+        """Test that an empty stream has no mean or percentiles."""
+        summary = summary_of(RunningStats(), QuantileSketch())
+        self.assertEqual(summary['count'], 0)
+        self.assertIsNone(summary['mean'])
+        self.assertIsNone(summary['p95'])
+
+
+class TestAgeStatsFromStream(unittest.TestCase):
+    """
+    Integration test: the statistics of stream_user_ages over the SQLite
+    stand-in match those of the rows that were loaded.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def test_calculate_age_stats(self):
+        """Test the single-pass statistics of the age stream."""
+        ages = [age for _, _, _, age in USERS]
+        summary = stream_ages.calculate_age_stats()
+        self.assertEqual(summary['count'], len(ages))
+        self.assertAlmostEqual(summary['mean'], statistics.fmean(ages))
+        self.assertAlmostEqual(summary['variance'], statistics.pvariance(ages))
+        self.assertEqual((summary['min'], summary['max']), (min(ages), max(ages)))
+        self.assertAlmostEqual(summary['p50'], statistics.median(ages), delta=2)
+
+    def test_where(self):
+        """Test that a where filter restricts the stream."""
+        ages = [age for _, _, _, age in USERS if age > 60]
+        summary = stream_ages.calculate_age_stats(where=[('age', '>', 60)])
+        self.assertEqual(summary['count'], len(ages))
+        self.assertAlmostEqual(summary['mean'], statistics.fmean(ages))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Unit tests for 0-stream_users.py
+"""
+import contextlib
+import functools
+import io
+import itertools
+import os
+import threading
+import unittest
+from parameterized import parameterized
+import mysql.connector
+import seed
+import sqlite_backend
+from seed import load_checkpoint
+from fixtures import USERS, drop_sqlite_users, use_sqlite_users
+
+stream_users_module = __import__('0-stream_users')
+stream_users = stream_users_module.stream_users
+resumable_stream_users = stream_users_module.resumable_stream_users
+
+
+class DroppingConnection(sqlite_backend.SQLiteConnection):
+    """A SQLite connection whose link drops after a number of fetches."""
+
+    def __init__(self, path, fetches):
+        super().__init__(path)
+        self.fetches = fetches
+
+    def cursor(self, *args, **kwargs):
+        cursor = super().cursor(*args, **kwargs)
+        fetchmany = cursor.fetchmany
+
+        def dropping_fetchmany(size=1):
+            if self.fetches is not None:
+                if self.fetches == 0:
+                    self._open = False
+                    raise mysql.connector.OperationalError("Lost connection to server")
+                self.fetches -= 1
+            return fetchmany(size)
+
+        cursor.fetchmany = dropping_fetchmany
+        return cursor
+
+    def close(self):
+        """Closes the SQLite connection, even after a simulated drop."""
+        self._open = True
+        super().close()
+
+
+class DroppingConnect:
+    """
+    A connect factory whose first drops connections lose their link after
+    fetches fetches; later connections never fail.
+    """
+
+    def __init__(self, path, drops, fetches=2):
+        self.path = path
+        self.drops = drops
+        self.fetches = fetches
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            dropping = self.drops > 0
+            self.drops -= 1
+        return DroppingConnection(self.path, self.fetches if dropping else None)
+
+
+class TestStreamUsers(unittest.TestCase):
+    """
+    Integration test: stream_users and resumable_stream_users, backed by
+    the SQLite stand-in.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Loads the fixture users."""
+        use_sqlite_users(cls)
+        cls.database = os.path.join(cls._workdir.name, 'users.db')
+        cls.user_ids = sorted(user_id for user_id, _, _, _ in USERS)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the fixture database."""
+        drop_sqlite_users(cls)
+
+    def setUp(self):
+        """Points the shared pool back at the fixture database."""
+        seed.configure_pool(connect=functools.partial(sqlite_backend.connect, self.database))
+        self.checkpoint = os.path.join(self._workdir.name, 'stream.checkpoint')
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def assert_released(self):
+        """Checks that no pooled connection is left checked out."""
+        self.assertEqual(seed.get_pool().get_stats()['checked_out'], 0)
+
+    def test_stream_users(self):
+        """Test that stream_users yields every user as a dict."""
+        rows = list(stream_users(fetch_size=64))
+        self.assertEqual(sorted(row['user_id'] for row in rows), self.user_ids)
+        self.assertEqual(set(rows[0]), set(seed.USER_COLUMNS))
+        self.assert_released()
+
+    def test_stream_users_pushdown(self):
+        """Test that columns and where reach the SQL."""
+        rows = list(stream_users(as_tuples=True, columns=['user_id', 'age'],
+                                 where=[('age', '>=', 60)]))
+        expected = sorted((user_id, age) for user_id, _, _, age in USERS if age >= 60)
+        self.assertEqual(sorted((user_id, int(age)) for user_id, age in rows), expected)
+
+    @parameterized.expand([
+        ('dicts', {}, lambda row: row['user_id']),
+        ('tuples', {'as_tuples': True}, lambda row: row[0]),
+        ('user_rows', {'row_factory': seed.UserRow._make}, lambda row: row.user_id),
+    ])
+    def test_resumable_in_order(self, _, options, user_id):
+        """Test that the resumable stream yields every user in user_id order."""
+        rows = resumable_stream_users(fetch_size=64, **options)
+        self.assertEqual([user_id(row) for row in rows], self.user_ids)
+        self.assert_released()
+
+    def test_resumable_where(self):
+        """Test that the keyset condition is combined with where."""
+        rows = resumable_stream_users(fetch_size=16, where=[('age', '<', 30)])
+        self.assertEqual([row['user_id'] for row in rows],
+                         sorted(user_id for user_id, _, _, age in USERS if age < 30))
+
+    def test_columns_need_user_id(self):
+        """Test that a projection without user_id is rejected."""
+        with self.assertRaises(ValueError):
+            next(resumable_stream_users(columns=['name', 'age']))
+
+    def test_last_user_id(self):
+        """Test starting after a given user_id."""
+        rows = resumable_stream_users(last_user_id=self.user_ids[249])
+        self.assertEqual([row['user_id'] for row in rows], self.user_ids[250:])
+
+    def test_reconnects(self):
+        """Test that dropped connections are resumed without gaps or repeats."""
+        seed.configure_pool(connect=DroppingConnect(self.database, drops=2, fetches=2))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            rows = list(resumable_stream_users(fetch_size=64, retry_delay=0))
+        self.assertEqual([row['user_id'] for row in rows], self.user_ids)
+        self.assertEqual(output.getvalue().count('reconnecting'), 2)
+        self.assert_released()
+
+    def test_gives_up(self):
+        """Test that the error is raised after max_retries failures in a row."""
+        seed.configure_pool(connect=DroppingConnect(self.database, drops=10, fetches=0))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            with self.assertRaises(mysql.connector.OperationalError):
+                list(resumable_stream_users(max_retries=2, retry_delay=0))
+        self.assertEqual(output.getvalue().count('reconnecting'), 2)
+        self.assert_released()
+
+    def test_checkpoint(self):
+        """Test that a restarted stream re-delivers at most one fetch."""
+        rows = resumable_stream_users(checkpoint_file=self.checkpoint, fetch_size=64)
+        consumed = [row['user_id'] for row in itertools.islice(rows, 100)]
+        rows.close()
+        self.assertEqual(load_checkpoint(self.checkpoint),
+                         {'last_user_id': self.user_ids[63]})
+        rest = [row['user_id'] for row in
+                resumable_stream_users(checkpoint_file=self.checkpoint, fetch_size=64)]
+        self.assertEqual(rest, self.user_ids[64:])
+        self.assertEqual(consumed, self.user_ids[:100])
+        self.assertEqual(load_checkpoint(self.checkpoint)['last_user_id'], self.user_ids[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()